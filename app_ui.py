@@ -129,20 +129,8 @@ class Ui_MainWindow(object):
         self.dataFrame.setObjectName("dataFrame")
         self.gridLayout_2 = QtWidgets.QGridLayout(self.dataFrame)
         self.gridLayout_2.setObjectName("gridLayout_2")
-        self.table = QtWidgets.QTableWidget(parent=self.dataFrame)
+        self.table = QtWidgets.QTableView(parent=self.dataFrame)
         self.table.setObjectName("table")
-        self.table.setColumnCount(5)
-        self.table.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.table.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.table.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.table.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.table.setHorizontalHeaderItem(3, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.table.setHorizontalHeaderItem(4, item)
         self.table.horizontalHeader().setDefaultSectionSize(90)
         self.table.horizontalHeader().setSortIndicatorShown(False)
         self.table.horizontalHeader().setStretchLastSection(False)
@@ -315,16 +303,6 @@ class Ui_MainWindow(object):
         self.camerasLabel.setText(_translate("MainWindow", "Cameras"))
         self.toggleCameraButton.setText(_translate("MainWindow", "Toggle"))
         self.visualizeButton.setText(_translate("MainWindow", "Visualize"))
-        item = self.table.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "#"))
-        item = self.table.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Age"))
-        item = self.table.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Gender"))
-        item = self.table.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Datetime"))
-        item = self.table.horizontalHeaderItem(4)
-        item.setText(_translate("MainWindow", "Cam"))
         self.dataGroupbox.setTitle(_translate("MainWindow", "Data"))
         self.reloadButton.setText(_translate("MainWindow", "Reload"))
         self.clearButton.setText(_translate("MainWindow", "Clear"))
@@ -0,0 +1,147 @@
+"""Benchmark inference profiles and save the fastest one that is good enough.
+
+Usage:
+    python autotune.py samples/ --min-recall 0.9
+
+Every candidate profile runs detection and classification on the sample
+frames. Its quality is the share of faces found by the reference profile
+(the largest detector input) that it also finds. The fastest candidate above
+the quality floor is saved as the "auto" profile and activated.
+"""
+import argparse
+import itertools
+import os
+import statistics
+import time
+
+import cv2
+
+import inference
+from config import getProfile, saveProfile, DEFAULT_PROFILE
+from logger import logger
+from models import models
+from tracker import iou
+
+DETECT_SIZES = [[400, 400], [300, 300], [240, 240], [180, 180]]
+
+
+def loadSamples(path: str, count: int) -> list:
+    frames = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                frames.append(frame)
+            if len(frames) >= count:
+                break
+        return frames
+
+    cap = cv2.VideoCapture(int(path) if path.isdigit() else path)
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def availableTargets() -> list[tuple[str, str]]:
+    targets = [("default", "cpu")]
+    if cv2.ocl.haveOpenCL():
+        targets += [("opencv", "opencl"), ("opencv", "opencl_fp16")]
+    if hasattr(cv2, "cuda") and cv2.cuda.getCudaEnabledDeviceCount() > 0:
+        targets += [("cuda", "cuda"), ("cuda", "cuda_fp16")]
+    return targets
+
+
+def candidates(base: dict) -> list[dict]:
+    cpus = os.cpu_count() or 1
+    threads = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    return [
+        {**base, "detectSize": size, "threads": n, "backend": backend, "target": target}
+        for size, n, (backend, target)
+        in itertools.product(DETECT_SIZES, threads, availableTargets())
+    ]
+
+
+def run(profile: dict, frames: list) -> tuple[list[list], list[float]]:
+    inference.setProfile(profile)
+    models.preload()
+    detections, latencies = [], []
+    for frame in frames:
+        started = time.perf_counter()
+        _, bboxes = inference.faceBox(models.get("face"), frame)
+        inference.predictFaces(frame, bboxes)
+        latencies.append((time.perf_counter() - started) * 1000)
+        detections.append(bboxes)
+    return detections, latencies
+
+
+def recall(reference: list[list], detections: list[list]) -> float:
+    total = sum(len(boxes) for boxes in reference)
+    if total == 0:
+        return 1.0
+    found = sum(
+        any(iou(ref, box) >= 0.5 for box in boxes)
+        for refs, boxes in zip(reference, detections)
+        for ref in refs
+    )
+    return found / total
+
+
+def autotune(samples: str, count: int, minRecall: float, name: str) -> dict | None:
+    frames = loadSamples(samples, count)
+    if not frames:
+        logger.error(f"No sample frames could be read from {samples}")
+        return None
+
+    base = {**DEFAULT_PROFILE, **{k: v for k, v in getProfile().items() if k != "name"}}
+    reference, _ = run({**base, "detectSize": DETECT_SIZES[0]}, frames)
+
+    results = []
+    for profile in candidates(base):
+        try:
+            detections, latencies = run(profile, frames)
+        except cv2.error as e:
+            logger.warning(f"Skipping {profile['backend']}/{profile['target']}: {e}")
+            continue
+        result = {
+            "profile": profile,
+            "latencyMs": statistics.median(latencies),
+            "p95Ms": sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "fps": 1000 * len(latencies) / sum(latencies),
+            "recall": recall(reference, detections),
+        }
+        results.append(result)
+        logger.info(
+            f"{profile['detectSize'][0]}px {profile['threads']} threads "
+            f"{profile['backend']}/{profile['target']}: {result['fps']:.1f} fps, "
+            f"median {result['latencyMs']:.1f} ms, p95 {result['p95Ms']:.1f} ms, "
+            f"recall {result['recall']:.2f}")
+
+    accepted = [r for r in results if r["recall"] >= minRecall]
+    inference.setProfile(getProfile())
+    if not accepted:
+        logger.error(f"No profile reached a recall of {minRecall}")
+        return None
+
+    best = max(accepted, key=lambda r: r["fps"])
+    saveProfile(name, best["profile"], activate=True)
+    logger.info(f"Profile '{name}' saved with {best['fps']:.1f} fps")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("samples",
+                        help="image folder, video file or camera index")
+    parser.add_argument("--frames", type=int, default=50,
+                        help="number of sample frames")
+    parser.add_argument("--min-recall", type=float, default=0.9,
+                        help="quality floor compared to the reference profile")
+    parser.add_argument("--name", default="auto",
+                        help="name of the saved profile")
+    args = parser.parse_args()
+
+    autotune(args.samples, args.frames, args.min_recall, args.name)
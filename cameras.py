@@ -0,0 +1,203 @@
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from config import loadConfig, updateConfig, getCameraConfig
+from logger import logger
+from sources import openSource
+
+import cv2
+
+PROBE_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+PROBE_FOURCCS = ["MJPG", "YUYV"]
+
+
+def fourccToStr(value: float) -> str:
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)).strip("\x00")
+
+
+def applyCaptureFormat(cap, captureFormat: dict) -> None:
+    # FOURCC has to be set before the size for most UVC drivers
+    if captureFormat.get("fourcc"):
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*captureFormat["fourcc"]))
+    if captureFormat.get("width") and captureFormat.get("height"):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, captureFormat["width"])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, captureFormat["height"])
+    if captureFormat.get("fps"):
+        cap.set(cv2.CAP_PROP_FPS, captureFormat["fps"])
+
+
+def currentFormat(cap) -> dict:
+    return {
+        "fourcc": fourccToStr(cap.get(cv2.CAP_PROP_FOURCC)),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(cap.get(cv2.CAP_PROP_FPS), 1),
+    }
+
+
+def openCapture(cameraIndex):
+    if not isinstance(cameraIndex, int):
+        # Replayed and synthetic sources, see sources.py
+        return openSource(cameraIndex)
+    cap = cv2.VideoCapture(cameraIndex)
+    captureFormat = getCameraConfig(cameraIndex)["captureFormat"]
+    if cap.isOpened() and captureFormat:
+        applyCaptureFormat(cap, captureFormat)
+        logger.info(f"CAM {cameraIndex} capture format: {currentFormat(cap)}")
+    return cap
+
+
+class CapturePool:
+    """Keeps the most recently used captures open for instant switching.
+
+    `acquire` hands out a warm capture when there is one and opens the device
+    otherwise, `release` puts it back. Only the `size` most recently released
+    captures are kept, older ones are closed.
+    """
+
+    def __init__(self, size: int = 2) -> None:
+        self.size = size
+        self._captures: dict[int, object] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, cameraIndex) -> tuple[object, bool]:
+        with self._lock:
+            cap = self._captures.pop(cameraIndex, None)
+        if cap is not None and cap.isOpened():
+            return cap, True
+        return openCapture(cameraIndex), False
+
+    def release(self, cameraIndex, cap) -> None:
+        if self.size <= 0 or not isinstance(cameraIndex, int) or not cap.isOpened():
+            cap.release()
+            return
+        with self._lock:
+            old = self._captures.pop(cameraIndex, None)
+            self._captures[cameraIndex] = cap
+            evicted = list(self._captures)[:-self.size]
+            evicted = [self._captures.pop(i) for i in evicted]
+        for other in ([old] if old is not None and old is not cap else []) + evicted:
+            other.release()
+
+    def discard(self, cameraIndex: int) -> None:
+        with self._lock:
+            cap = self._captures.pop(cameraIndex, None)
+        if cap is not None:
+            cap.release()
+
+    def closeAll(self) -> None:
+        with self._lock:
+            captures, self._captures = list(self._captures.values()), {}
+        for cap in captures:
+            cap.release()
+        logger.info("Camera pool closed")
+
+
+capturePool = CapturePool()
+
+
+def probeCamera(cameraIndex: int) -> dict | None:
+    cap = cv2.VideoCapture(cameraIndex)
+    try:
+        if not cap.isOpened():
+            return None
+        info = {"index": cameraIndex, "default": currentFormat(cap), "formats": []}
+        for fourcc in PROBE_FOURCCS:
+            for width, height in PROBE_RESOLUTIONS:
+                applyCaptureFormat(cap, {"fourcc": fourcc, "width": width, "height": height})
+                found = currentFormat(cap)
+                # Drivers silently fall back to the nearest mode they support
+                if (found["width"], found["height"]) == (width, height) \
+                        and found["fourcc"] == fourcc \
+                        and found not in info["formats"]:
+                    info["formats"].append(found)
+        return info
+    finally:
+        cap.release()
+
+
+def cachedCameras() -> list[dict]:
+    return loadConfig().get("discovered", {}).get("cameras", [])
+
+
+def saveCameras(cameras: list[dict]) -> None:
+    def update(config: dict) -> None:
+        config["discovered"] = {
+            "cameras": sorted(cameras, key=lambda c: c["index"]),
+            "time": time.time(),
+        }
+    updateConfig(update)
+
+
+class CameraScanner(QThread):
+    """Probes camera indexes in parallel and reports each device as found.
+
+    Opening a missing index can block for seconds, so every index is probed
+    on its own worker thread. Indexes in `skip` (e.g. the camera in use) are
+    not opened, their cached entry is kept. After `requestInterruption` the
+    scan ends with the probes already running and saves nothing.
+    """
+    found = pyqtSignal(dict)
+    done = pyqtSignal(list)
+
+    def __init__(self, maxIndex: int = 8, skip: set[int] | None = None, parent=None) -> None:
+        super().__init__(parent)
+        self.maxIndex = maxIndex
+        self.skip = skip or set()
+
+    def run(self) -> None:
+        started = time.perf_counter()
+        cameras = [c for c in cachedCameras() if c["index"] in self.skip]
+        indexes = [i for i in range(self.maxIndex) if i not in self.skip]
+        with ThreadPoolExecutor(max_workers=len(indexes) or 1) as executor:
+            futures = [executor.submit(probeCamera, i) for i in indexes]
+            for future in as_completed(futures):
+                if self.isInterruptionRequested():
+                    for other in futures:
+                        other.cancel()
+                    break
+                try:
+                    info = future.result()
+                except Exception as e:
+                    logger.error(f"Camera probe failed: {e}")
+                    continue
+                if info is not None:
+                    cameras.append(info)
+                    self.found.emit(info)
+        if self.isInterruptionRequested():
+            return
+        saveCameras(cameras)
+        logger.info(
+            f"{len(cameras)} cameras found in {time.perf_counter() - started:.1f} s")
+        self.done.emit(cameras)
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import setCameraConfig
+
+    parser = argparse.ArgumentParser(
+        description="List cameras or set the capture format of one")
+    parser.add_argument("--cam", type=int, help="camera index to configure")
+    parser.add_argument("--format", nargs=4, metavar=("FOURCC", "WIDTH", "HEIGHT", "FPS"),
+                        help="e.g. MJPG 1280 720 30")
+    parser.add_argument("--max-index", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.cam is not None and args.format:
+        fourcc, width, height, fps = args.format
+        setCameraConfig(args.cam, captureFormat={
+            "fourcc": fourcc, "width": int(width), "height": int(height), "fps": float(fps)})
+    else:
+        with ThreadPoolExecutor(max_workers=args.max_index) as executor:
+            cameras = [c for c in executor.map(probeCamera, range(args.max_index)) if c]
+        saveCameras(cameras)
+        for camera in cameras:
+            print(f"CAM {camera['index']}: default {camera['default']}")
+            for f in camera["formats"]:
+                print(f"    {f['fourcc']} {f['width']}x{f['height']} @ {f['fps']}")
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+
+from logger import logger
+
+CONFIG_PATH = "config.json"
+
+# Serializes read-modify-write cycles, e.g. of the camera scanner thread
+_lock = threading.RLock()
+
+DEFAULT_CAMERA_CONFIG = {
+    # Run the face detector every N frames, track boxes in between
+    "detectInterval": 1,
+    # Also force a detection after this many seconds (0 disables the timer)
+    "detectSeconds": 0.0,
+    # Classify a new face on its first K frames, then every N frames
+    "classifyFrames": 5,
+    "classifyRefresh": 90,
+    # Skip the detector on static frames, share of changed pixels that counts
+    # as motion and seconds after which a frame is analyzed anyway
+    "motionGate": True,
+    "motionThreshold": 0.002,
+    "motionKeepAlive": 2.0,
+    # Regions where faces are searched, relative rectangles [x1, y1, x2, y2]
+    # or polygons [[x, y], ...]. Empty means the whole frame.
+    "rois": [],
+    # Requested capture format, e.g. {"fourcc": "MJPG", "width": 1280,
+    # "height": 720, "fps": 30}. Empty keeps the driver default.
+    "captureFormat": {},
+}
+
+DEFAULT_PROFILE = {
+    # Input size of the SSD face detector blob (width, height)
+    "detectSize": [300, 300],
+    # Input size of the age/gender blobs, the caffe models expect 227x227
+    "classifySize": [227, 227],
+    "confidence": 0.7,
+    # IoU above which overlapping detections are merged
+    "nmsThreshold": 0.4,
+    # Faces with a shorter side (in pixels) are ignored
+    "minFaceSize": 20,
+    "padding": 20,
+    # Tiled detection for high resolution cameras: "off", "fixed" uses
+    # tileGrid (columns, rows), "auto" picks the grid from the frame size and
+    # keeps the estimated detector time per frame under tileBudgetMs
+    "tiling": "off",
+    "tileGrid": [2, 2],
+    "tileOverlap": 0.2,
+    "tileBudgetMs": 80,
+    # cv2.dnn backend/target names, see inference.BACKENDS and TARGETS
+    "backend": "default",
+    "target": "cpu",
+    # cv2.setNumThreads value, 0 uses every CPU
+    "threads": 0,
+}
+
+BUILTIN_PROFILES = {
+    "default": {},
+    "low-end": {"detectSize": [200, 200], "threads": 2},
+    "server": {"detectSize": [400, 400], "threads": 0, "tiling": "auto"},
+}
+
+DEFAULT_GOVERNOR_CONFIG = {
+    # Inference frames per second to hold, 0 disables the FPS target
+    "targetFps": 0,
+    # Share of the total CPU the process may use in percent, 0 disables it
+    "targetCpu": 0,
+}
+
+DEFAULT_RETENTION_CONFIG = {
+    # Raw rows older than this many days are moved to the archive, 0 keeps all
+    "rawDays": 0,
+    # Folder of the per-day gzip CSV archives
+    "archiveDir": "archive",
+    # Days archived per maintenance run, keeps each run short
+    "maxDays": 7,
+    # Free pages returned to the file system per maintenance run
+    "vacuumPages": 1000,
+}
+
+DEFAULT_EVENTLOG_CONFIG = {
+    # Write detections to the binary event log instead of single inserts
+    "enabled": False,
+    "directory": "eventlog",
+    # Records per memory-mapped segment file (16 bytes each)
+    "segmentRecords": 65536,
+    # Seconds between compaction runs and maximum age of the active segment
+    "compactInterval": 5.0,
+    "maxSegmentSeconds": 30.0,
+}
+
+
+def loadConfig() -> dict:
+    if not os.path.exists(CONFIG_PATH):
+        return {}
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Config could not be loaded: {e}")
+        return {}
+
+
+def saveConfig(config: dict) -> None:
+    tmpPath = CONFIG_PATH + ".tmp"
+    with open(tmpPath, "w", encoding="utf-8") as file:
+        json.dump(config, file, indent=4)
+    os.replace(tmpPath, CONFIG_PATH)
+
+
+def updateConfig(update) -> None:
+    """Applies `update(config)` to the saved config, one writer at a time."""
+    with _lock:
+        config = loadConfig()
+        update(config)
+        saveConfig(config)
+
+
+def getCameraConfig(cameraIndex) -> dict:
+    cameras = loadConfig().get("cameras", {})
+    return {**DEFAULT_CAMERA_CONFIG, **cameras.get(str(cameraIndex), {})}
+
+
+def setCameraConfig(cameraIndex, **options) -> None:
+    def update(config: dict) -> None:
+        cameras = config.setdefault("cameras", {})
+        cameras.setdefault(str(cameraIndex), {}).update(options)
+    updateConfig(update)
+    logger.info(f"CAM {cameraIndex} config updated: {options}")
+
+
+def getProfile(name: str | None = None) -> dict:
+    config = loadConfig()
+    name = name or config.get("profile", "default")
+    profiles = {**BUILTIN_PROFILES, **config.get("profiles", {})}
+    if name not in profiles:
+        logger.error(f"Unknown inference profile '{name}', using default")
+        name = "default"
+    return {**DEFAULT_PROFILE, **profiles[name], "name": name}
+
+
+def saveProfile(name: str, profile: dict, activate: bool = False) -> None:
+    def update(config: dict) -> None:
+        config.setdefault("profiles", {})[name] = {
+            key: value for key, value in profile.items() if key in DEFAULT_PROFILE
+        }
+        if activate:
+            config["profile"] = name
+    updateConfig(update)
+    logger.info(f"Inference profile '{name}' saved")
+
+
+def getGovernorConfig() -> dict:
+    return {**DEFAULT_GOVERNOR_CONFIG, **loadConfig().get("governor", {})}
+
+
+def getRetentionConfig() -> dict:
+    return {**DEFAULT_RETENTION_CONFIG, **loadConfig().get("retention", {})}
+
+
+def getEventLogConfig() -> dict:
+    return {**DEFAULT_EVENTLOG_CONFIG, **loadConfig().get("eventLog", {})}
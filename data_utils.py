@@ -1,6 +1,8 @@
-from db import DB
+from db import connections
+from models import ageList
 import pandas as pd
 import io
+from datetime import datetime
 import matplotlib.pyplot as plt
 import seaborn as sns
 
@@ -10,19 +12,23 @@ plt.style.use('seaborn-v0_8-poster')
 MCOLOR = '#6488EA'
 FCOLOR = '#FDB0C0'
 
-db = DB()
-db.connect()
-ageList = ['(0-2)', '(4-6)', '(8-12)', '(13-17)', '(18-24)',
-           '(25-32)', '(38-43)', '(48-53)', '(60-100)']
 
 
-def __getDF() -> pd.DataFrame:
-    df = pd.DataFrame(db.fetchAll(), columns=[
-        "ID", "Camera", "Age", "Gender", "Datetime"])
+def __getRollupDF(start: datetime | None = None, end: datetime | None = None) -> pd.DataFrame:
+    # Minute buckets for short ranges, hour buckets otherwise
+    with connections.reader() as db:
+        first, last = db.timeRange()
+        if first is None:
+            granularity = "hour"
+        else:
+            span = (end.timestamp() if end else last) - (start.timestamp() if start else first)
+            granularity = "minute" if span <= 2 * 24 * 3600 else "hour"
+        rows = db.fetchRollup(granularity, start, end)
 
+    df = pd.DataFrame(rows, columns=[
+        "Datetime", "Camera", "Age", "Gender", "Count"])
     df['Age'] = pd.Categorical(df['Age'], categories=ageList, ordered=True)
     df['Datetime'] = pd.to_datetime(df['Datetime'])
-    df = df.sort_values('Age')
 
     return df
 
@@ -36,15 +42,20 @@ def __plt2Bytes(plt) -> io.BytesIO:
     return buffer
 
 
+def hasData() -> bool:
+    with connections.reader() as db:
+        return db.timeRange()[0] is not None
+
+
 def getGenders() -> dict[str, int]:
-    genders = __getDF().Gender.value_counts()
-    return dict(genders)
+    with connections.reader() as db:
+        genders = db.countBy("genders", "gender")
+    return {gender: count for gender, count in genders.items() if count}
 
 
 def getAges() -> dict[str, int]:
-    ages = __getDF().Age.value_counts()
-    ages = dict(sorted(ages.items()))
-    return ages
+    with connections.reader() as db:
+        return db.countBy("ages", "age")
 
 
 def __display(plot: io.BytesIO):
@@ -56,20 +67,22 @@ def __display(plot: io.BytesIO):
 
 
 def getDataInfo() -> dict:
-    df = __getDF()
+    with connections.reader() as db:
+        genders = db.countBy("genders", "gender")
+        first, last = db.timeRange()
 
     info: dict = {
-        "totalRecord": df.Age.count(),
-        "maleCount": df.query("Gender == 'Male'").Gender.count(),
-        "femaleCount": df.query("Gender == 'Female'").Gender.count(),
-        "firstRecord": df.sort_values("Datetime", ascending=True).iloc[0, 4].strftime("%Y-%m-%d %H:%M:%S"),
-        "lastRecord": df.sort_values("Datetime", ascending=False).iloc[0, 4].strftime("%Y-%m-%d %H:%M:%S")
+        "totalRecord": sum(genders.values()),
+        "maleCount": genders.get("Male", 0),
+        "femaleCount": genders.get("Female", 0),
+        "firstRecord": datetime.fromtimestamp(first).strftime("%Y-%m-%d %H:%M:%S"),
+        "lastRecord": datetime.fromtimestamp(last).strftime("%Y-%m-%d %H:%M:%S")
     }
     return info
 
 
 def getAgesPiePlot(useGradientColor: bool = False) -> io.BytesIO:
-    ages = __getDF().Age.value_counts()
+    ages = pd.Series(getAges())
     ages = ages[ages.values > 0]
     plt.figure(figsize=(8, 8))
     plt.title("Ages")
@@ -84,7 +97,7 @@ def getAgesPiePlot(useGradientColor: bool = False) -> io.BytesIO:
 
 
 def getGendersPiePlot() -> io.BytesIO:
-    genders = __getDF().Gender.value_counts()
+    genders = pd.Series(getGenders())
     plt.figure(figsize=(8, 8))
     plt.title("Genders")
     colors = [MCOLOR, FCOLOR]
@@ -95,29 +108,30 @@ def getGendersPiePlot() -> io.BytesIO:
 
 
 def getAgeWithGenderPlot() -> io.BytesIO:
-    df = __getDF()
+    df = __getRollupDF()
+    df = df.groupby(["Age", "Gender"], observed=False).Count.sum().reset_index()
     plt.figure(figsize=(10, 8))
     plt.title("Ages by Gender")
-    sns.countplot(data=df, x="Age", hue="Gender", palette=[MCOLOR, FCOLOR])
+    sns.barplot(data=df, x="Age", y="Count", hue="Gender", palette=[MCOLOR, FCOLOR])
     plt.ylabel("Count")
 
     return __plt2Bytes(plt)
 
 
 def getAgeDistributionPlot() -> io.BytesIO:
-    df = __getDF()
+    df = __getRollupDF()
     plt.figure(figsize=(10, 8))
     plt.title("Ages Distribution")
-    sns.histplot(data=df, x="Age", kde=True)
+    sns.histplot(data=df, x="Age", weights="Count", kde=True)
 
     return __plt2Bytes(plt)
 
 
-def getCountByDateHist() -> io.BytesIO:
-    df = __getDF()
+def getCountByDateHist(start: datetime | None = None, end: datetime | None = None) -> io.BytesIO:
+    df = __getRollupDF(start, end)
     plt.figure(figsize=(10, 8))
     plt.title("Record Count by Date")
-    sns.histplot(data=df, x="Datetime", bins=30)
+    sns.histplot(data=df, x="Datetime", weights="Count", bins=30)
     plt.xlabel("Date")
     plt.ylabel("Count")
     plt.xticks(rotation=90)
@@ -126,11 +140,11 @@ def getCountByDateHist() -> io.BytesIO:
     return __plt2Bytes(plt)
 
 
-def getCountWithGenderByDateHist() -> io.BytesIO:
-    df = __getDF()
+def getCountWithGenderByDateHist(start: datetime | None = None, end: datetime | None = None) -> io.BytesIO:
+    df = __getRollupDF(start, end)
     plt.figure(figsize=(10, 8))
     plt.title("Record Count with Gender by Date")
-    sns.histplot(data=df, x="Datetime", hue="Gender",
+    sns.histplot(data=df, x="Datetime", weights="Count", hue="Gender",
                  palette=[MCOLOR, FCOLOR], bins=30, multiple="stack")
     plt.xlabel("Date")
     plt.ylabel("Count")
@@ -140,11 +154,11 @@ def getCountWithGenderByDateHist() -> io.BytesIO:
     return __plt2Bytes(plt)
 
 
-def getCountWithAgeByDateHist() -> io.BytesIO:
-    df = __getDF()
+def getCountWithAgeByDateHist(start: datetime | None = None, end: datetime | None = None) -> io.BytesIO:
+    df = __getRollupDF(start, end)
     plt.figure(figsize=(10, 8))
     plt.title("Record Count with Age by Date")
-    sns.histplot(data=df, x="Datetime", hue="Age", bins=30, multiple="stack")
+    sns.histplot(data=df, x="Datetime", weights="Count", hue="Age", bins=30, multiple="stack")
     plt.xlabel("Date")
     plt.ylabel("Count")
     plt.xticks(rotation=90)
@@ -1,8 +1,82 @@
+import queue
 import sqlite3
+import threading
+import time
 
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+
+from logger import logger
+from models import ageList, genderList
 
 DB_NAME = "data.db"
+SCHEMA_VERSION = 2
+
+LOOKUP_TABLES = ("cameras", "ages", "genders")
+ROLLUPS = {"minute": 60, "hour": 3600}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cameras(code INTEGER PRIMARY KEY, label TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS ages(code INTEGER PRIMARY KEY, label TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS genders(code INTEGER PRIMARY KEY, label TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS infos(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cam INTEGER NOT NULL REFERENCES cameras(code),
+    age INTEGER NOT NULL REFERENCES ages(code),
+    gender INTEGER NOT NULL REFERENCES genders(code),
+    ts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS infos_ts ON infos(ts);
+CREATE INDEX IF NOT EXISTS infos_cam_ts ON infos(cam, ts);
+CREATE VIEW IF NOT EXISTS infos_labeled AS
+    SELECT i.id, c.label AS cam, a.label AS age, g.label AS gender,
+           datetime(i.ts, 'unixepoch', 'localtime') AS datetime
+    FROM infos i
+    JOIN cameras c ON c.code = i.cam
+    JOIN ages a ON a.code = i.age
+    JOIN genders g ON g.code = i.gender;
+""" + "".join(f"""
+CREATE TABLE IF NOT EXISTS rollup_{name}(
+    bucket INTEGER NOT NULL,
+    cam INTEGER NOT NULL,
+    age INTEGER NOT NULL,
+    gender INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY(bucket, cam, age, gender)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS infos_rollup_{name} AFTER INSERT ON infos BEGIN
+    INSERT INTO rollup_{name}(bucket, cam, age, gender, count)
+    VALUES(NEW.ts - NEW.ts % {seconds}, NEW.cam, NEW.age, NEW.gender, 1)
+    ON CONFLICT(bucket, cam, age, gender) DO UPDATE SET count = count + 1;
+END;
+""" for name, seconds in ROLLUPS.items())
+
+
+# Event log whose records are not compacted into infos yet, see eventlog.py
+pendingLog = None
+
+
+def setPendingLog(log) -> None:
+    global pendingLog
+    pendingLog = log
+
+
+def schemaStatements() -> list[str]:
+    statements, current = [], ""
+    for line in SCHEMA.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
+
+
+def toEpoch(dt) -> int:
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    return int(dt.timestamp())
 
 
 class DB:
@@ -10,37 +84,524 @@ class DB:
         self.conn = None
         self.cursor = None
 
-    def connect(self) -> None:
+    def connect(self, readonly: bool = False) -> None:
         try:
+            if readonly:
+                # Pooled readers move between threads, one at a time
+                self.conn = sqlite3.connect(
+                    Path(DB_NAME).absolute().as_uri() + "?mode=ro",
+                    uri=True, check_same_thread=False)
+                self.cursor = self.conn.cursor()
+                self.loadCodes()
+                return
             self.conn = sqlite3.connect(DB_NAME)
             self.cursor = self.conn.cursor()
+            # Takes effect for new files only, see retention.py for old ones
+            self.cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL lets readers run next to the writer, NORMAL skips the fsync
+            # per commit which WAL does not need for consistency
+            self.cursor.execute("PRAGMA journal_mode=WAL")
+            self.cursor.execute("PRAGMA synchronous=NORMAL")
+            self.migrate()
         except sqlite3.Error as e:
             print(str(e))
 
-    def insertData(self, data: dict) -> None:
-        cam = "CAM " + str(data["cam"])
-        age = data["age"]
-        gender = data["gender"]
-        dt = datetime.now()
+    def migrate(self) -> None:
+        """Creates the schema or converts a text-only `infos` table in place."""
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            self.loadCodes()
+            return
+
+        # One transaction which also keeps other connections from migrating
+        # at the same time, an interrupted migration leaves the old table intact
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                self.conn.commit()
+                self.loadCodes()
+                return
+            columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(infos)")]
+            legacy = "datetime" in columns
+            if legacy:
+                self.cursor.execute("ALTER TABLE infos RENAME TO infos_legacy")
+            for statement in schemaStatements():
+                self.cursor.execute(statement)
+            # Codes of the built-in labels follow the model outputs, so ordering
+            # by code orders the age buckets
+            self.cursor.executemany(
+                "INSERT OR IGNORE INTO ages(code, label) VALUES(?, ?)", enumerate(ageList))
+            self.cursor.executemany(
+                "INSERT OR IGNORE INTO genders(code, label) VALUES(?, ?)", enumerate(genderList))
+            if legacy:
+                # Missing labels are kept as 'unknown' instead of losing the row
+                for table, column in zip(LOOKUP_TABLES, ("cam", "age", "gender")):
+                    self.cursor.execute(
+                        f"INSERT OR IGNORE INTO {table}(label) "
+                        f"SELECT DISTINCT COALESCE({column}, 'unknown') FROM infos_legacy")
+                # Old timestamps are naive local time, 'utc' converts them
+                self.cursor.execute("""
+                    INSERT INTO infos(id, cam, age, gender, ts)
+                    SELECT * FROM (
+                        SELECT l.id, c.code, a.code, g.code,
+                               CAST(strftime('%s', substr(l.datetime, 1, 19), 'utc') AS INTEGER) AS ts
+                        FROM infos_legacy l
+                        JOIN cameras c ON c.label = COALESCE(l.cam, 'unknown')
+                        JOIN ages a ON a.label = COALESCE(l.age, 'unknown')
+                        JOIN genders g ON g.label = COALESCE(l.gender, 'unknown'))
+                    WHERE ts IS NOT NULL""")
+                migrated = self.cursor.rowcount
+                dropped = self.cursor.execute(
+                    "SELECT COUNT(*) FROM infos_legacy").fetchone()[0] - migrated
+                self.cursor.execute("DROP TABLE infos_legacy")
+            if version < 2:
+                self.rebuildRollups(commit=False)
+            self.cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        if legacy:
+            logger.info(f"Database migrated to schema {SCHEMA_VERSION}, {migrated} rows converted")
+            if dropped:
+                logger.warning(f"{dropped} legacy rows without a valid datetime were dropped")
+        self.loadCodes()
+
+    def rebuildRollups(self, commit: bool = True) -> None:
+        """Recomputes the rollup tables from the raw rows.
+
+        Inserts keep them up to date through triggers, this is only needed
+        for rows that were written around them. Archived rows are no longer
+        in infos, so minute buckets before the oldest raw row are kept and the
+        coarser rollups are summed up from the minute rollup.
+        """
+        first = self.cursor.execute("SELECT MIN(ts) FROM infos").fetchone()[0]
+        if first is not None:
+            # Archived days end at midnight, which is a minute boundary
+            cutoff = first - first % ROLLUPS["minute"]
+            self.cursor.execute("DELETE FROM rollup_minute WHERE bucket >= ?", (cutoff,))
+            self.cursor.execute(f"""
+                INSERT INTO rollup_minute(bucket, cam, age, gender, count)
+                SELECT ts - ts % {ROLLUPS["minute"]}, cam, age, gender, COUNT(*)
+                FROM infos GROUP BY 1, 2, 3, 4""")
+        for name, seconds in ROLLUPS.items():
+            if name == "minute":
+                continue
+            self.cursor.execute(f"DELETE FROM rollup_{name}")
+            self.cursor.execute(f"""
+                INSERT INTO rollup_{name}(bucket, cam, age, gender, count)
+                SELECT bucket - bucket % {seconds}, cam, age, gender, SUM(count)
+                FROM rollup_minute GROUP BY 1, 2, 3, 4""")
+        if commit:
+            self.conn.commit()
+
+    def fetchRollup(self, granularity: str = "hour", start: datetime | None = None,
+                    end: datetime | None = None) -> list[tuple]:
+        """Returns (datetime, cam, age, gender, count) rows between start and end."""
+        if granularity not in ROLLUPS:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        query = f"""
+            SELECT datetime(r.bucket, 'unixepoch', 'localtime'), c.label, a.label, g.label, r.count
+            FROM rollup_{granularity} r
+            JOIN cameras c ON c.code = r.cam
+            JOIN ages a ON a.code = r.age
+            JOIN genders g ON g.code = r.gender
+            WHERE r.bucket >= ? AND r.bucket < ?
+            ORDER BY r.bucket"""
+        bounds = (toEpoch(start) if start else 0,
+                  toEpoch(end) if end else 2**62)
+        return self.cursor.execute(query, bounds).fetchall()
 
-        query = r'INSERT INTO infos("cam", "age", "gender", "datetime") VALUES(?, ?, ?, ?)'
+    def countBy(self, table: str, column: str) -> dict[str, int]:
+        """Totals per label of a lookup table, in code order, from the hourly rollup."""
+        query = f"""
+            SELECT l.label, COALESCE(SUM(r.count), 0)
+            FROM {table} l LEFT JOIN rollup_hour r ON r.{column} = l.code
+            GROUP BY l.code ORDER BY l.code"""
+        with self.snapshot():
+            records = self.pendingRecords()
+            counts = dict(self.cursor.execute(query).fetchall())
+        index = ("cam", "age", "gender").index(column) + 1
+        labels = self.labels(table, records)
+        for record in records:
+            label = labels.get(record[index])
+            counts[label] = counts.get(label, 0) + 1
+        return counts
 
-        self.cursor.execute(query, (cam, age, gender, dt))
+    def fetchRange(self, start: datetime | None = None, end: datetime | None = None) -> list[tuple]:
+        with self.snapshot():
+            rows = self.pendingRows(toEpoch(start) if start else 0,
+                                    toEpoch(end) if end else 2**62)
+            return rows + self.fetchStored(start, end)
+
+    def fetchStored(self, start: datetime | None = None, end: datetime | None = None) -> list[tuple]:
+        """Rows of infos only, newest first, e.g. for archiving."""
+        query = """
+            SELECT * FROM infos_labeled
+            WHERE id IN (SELECT id FROM infos WHERE ts >= ? AND ts < ?)
+            ORDER BY id DESC"""
+        bounds = (toEpoch(start) if start else 0,
+                  toEpoch(end) if end else 2**62)
+        return self.cursor.execute(query, bounds).fetchall()
+
+    @contextmanager
+    def snapshot(self):
+        # Reads in the block see one state of the database, the event log is
+        # read before the first query so a segment compacted in between is
+        # either still pending or already in infos, never both
+        if self.conn.in_transaction:
+            yield
+            return
+        self.cursor.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self.conn.commit()
+
+    def pendingRecords(self) -> list[tuple]:
+        if pendingLog is None:
+            return []
+        segments = pendingLog.pending()
+        names = list(segments)
+        try:
+            compacted = {row[0] for row in self.cursor.execute(
+                f"SELECT segment FROM eventlog_compacted WHERE segment IN ({','.join('?' * len(names))})",
+                names)}
+        except sqlite3.OperationalError:
+            # Nothing was compacted yet
+            compacted = set()
+        return [record for name, records in segments.items() if name not in compacted
+                for record in records]
+
+    def pendingRows(self, first: int = 0, last: int = 2**62) -> list[tuple]:
+        """Event log rows between two epochs, newest first and without an id yet."""
+        records = [r for r in self.pendingRecords() if first <= r[0] < last]
+        if not records:
+            return []
+        cameras, ages, genders = (self.labels(table, records) for table in LOOKUP_TABLES)
+        rows = [
+            (None, cameras.get(cam), ages.get(age), genders.get(gender),
+             datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"))
+            for ts, cam, age, gender in records
+        ]
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+    def labels(self, table: str, records: list[tuple] = ()) -> dict[int, str]:
+        # Codes added by another connection are picked up on demand
+        index = LOOKUP_TABLES.index(table) + 1
+        labels = {code: label for label, code in self.codes[table].items()}
+        if any(record[index] not in labels for record in records):
+            self.loadCodes()
+            labels = {code: label for label, code in self.codes[table].items()}
+        return labels
+
+    def timeRange(self) -> tuple[int, int] | tuple[None, None]:
+        # Raw rows may be archived, the minute rollup still knows their time.
+        # Both come from an index. Buckets are rounded down, so the rollup only
+        # wins when it reaches back before the minute of the oldest raw row.
+        with self.snapshot():
+            times = [r[0] for r in self.pendingRecords()]
+            first, last = self.cursor.execute("SELECT MIN(ts), MAX(ts) FROM infos").fetchone()
+            rolledFirst = self.cursor.execute("SELECT MIN(bucket) FROM rollup_minute").fetchone()[0]
+            if last is None and rolledFirst is not None:
+                last = self.cursor.execute("SELECT MAX(bucket) FROM rollup_minute").fetchone()[0]
+        if rolledFirst is not None and (
+                first is None or rolledFirst < first - first % ROLLUPS["minute"]):
+            first = rolledFirst
+        if times:
+            first = min(times) if first is None else min(first, min(times))
+            last = max(times) if last is None else max(last, max(times))
+        return first, last
+
+    def loadCodes(self) -> None:
+        self.codes = {
+            table: dict(self.cursor.execute(f"SELECT label, code FROM {table}"))
+            for table in LOOKUP_TABLES
+        }
+
+    def code(self, table: str, label: str) -> int:
+        codes = self.codes[table]
+        if label not in codes:
+            # Another connection may have added it meanwhile
+            self.cursor.execute(f"INSERT OR IGNORE INTO {table}(label) VALUES(?)", (label,))
+            codes[label] = self.cursor.execute(
+                f"SELECT code FROM {table} WHERE label = ?", (label,)).fetchone()[0]
+        return codes[label]
+
+    def encode(self, d: dict) -> tuple:
+        return (
+            self.code("cameras", "CAM " + str(d["cam"])),
+            self.code("ages", d["age"]),
+            self.code("genders", d["gender"]),
+            toEpoch(d.get("datetime") or datetime.now()),
+        )
+
+    def insertData(self, data: dict) -> None:
+        query = r'INSERT INTO infos("cam", "age", "gender", "ts") VALUES(?, ?, ?, ?)'
+
+        self.cursor.execute(query, self.encode(data))
         self.conn.commit()
 
+    def insertMany(self, data: list[dict], commit: bool = True) -> None:
+        # Bulk variant of insertData, rows may carry their own "datetime"
+        rows = [self.encode(d) for d in data]
+        query = r'INSERT INTO infos("cam", "age", "gender", "ts") VALUES(?, ?, ?, ?)'
+
+        self.cursor.executemany(query, rows)
+        if commit:
+            self.conn.commit()
+
     def fetchAll(self) -> list[tuple]:
-        query = "SELECT * FROM infos ORDER BY id DESC"
-        result = self.cursor.execute(query).fetchall()
-        return result
+        # Same (id, cam, age, gender, datetime) labels as the old text schema,
+        # rows still in the event log come first
+        query = "SELECT * FROM infos_labeled ORDER BY id DESC"
+        with self.snapshot():
+            return self.pendingRows() + self.cursor.execute(query).fetchall()
+
+    def fetchPage(self, beforeId: int | None = None, limit: int = 500) -> list[tuple]:
+        """Up to `limit` rows older than `beforeId`, newest first."""
+        query = "SELECT * FROM infos_labeled WHERE id < ? ORDER BY id DESC LIMIT ?"
+        return self.cursor.execute(query, (beforeId or 2**62, limit)).fetchall()
+
+    def fetchSince(self, afterId: int) -> list[tuple]:
+        query = "SELECT * FROM infos_labeled WHERE id > ? ORDER BY id DESC"
+        return self.cursor.execute(query, (afterId,)).fetchall()
 
     def clearDatabase(self):
         self.cursor.execute("DELETE FROM infos")
         self.cursor.execute("DELETE FROM sqlite_sequence where name='infos'")
+        for name in ROLLUPS:
+            self.cursor.execute(f"DELETE FROM rollup_{name}")
         self.conn.commit()
 
 
+class DBWriter(threading.Thread):
+    """Write-behind writer, rows are queued and flushed in batches.
+
+    Every flush is one transaction with a single executemany, it happens when
+    `batchSize` rows are waiting or `flushInterval` seconds have passed. The
+    writer owns its own connection, `onFlush` is called from its thread with
+    the number of rows written. `maintenance(db)` runs on the same connection
+    every `maintenanceInterval` seconds, e.g. for retention, and `submit(fn)`
+    runs any other write as `fn(db)` between two flushes.
+    """
+
+    def __init__(self, batchSize: int = 500, flushInterval: float = 1.0,
+                 onFlush=None, maintenance=None, maintenanceInterval: float = 3600) -> None:
+        super().__init__(name="db-writer", daemon=True)
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.onFlush = onFlush
+        self.maintenance = maintenance
+        self.maintenanceInterval = maintenanceInterval
+        self.rowsWritten = 0
+        self.flushes = 0
+        self.lastFlushMs = 0.0
+        self.maxFlushMs = 0.0
+        self._queue = queue.Queue()
+        self._stopEvent = threading.Event()
+
+    def enqueue(self, data: list[dict]) -> None:
+        # Rows get their timestamp now, not when they are written
+        now = datetime.now()
+        for d in data:
+            self._queue.put({**d, "datetime": d.get("datetime") or now})
+
+    def submit(self, fn) -> Future:
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def queueDepth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "queueDepth": self.queueDepth(),
+            "rowsWritten": self.rowsWritten,
+            "flushes": self.flushes,
+            "lastFlushMs": round(self.lastFlushMs, 1),
+            "maxFlushMs": round(self.maxFlushMs, 1),
+        }
+
+    def _take(self, timeout: float) -> tuple[list[dict], tuple | None]:
+        # Collects rows until the batch is full, the time is up or a job comes
+        batch = []
+        deadline = time.perf_counter() + timeout
+        while len(batch) < self.batchSize:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = (self._queue.get(timeout=remaining) if remaining > 0
+                        else self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                return batch, item
+            batch.append(item)
+        return batch, None
+
+    def _runJob(self, db: DB, job: tuple) -> None:
+        fn, future = job
+        try:
+            future.set_result(fn(db))
+        except Exception as e:
+            db.conn.rollback()
+            future.set_exception(e)
+
+    def _flush(self, db: DB, batch: list[dict]) -> None:
+        started = time.perf_counter()
+        try:
+            db.insertMany(batch)
+        except sqlite3.Error as e:
+            db.conn.rollback()
+            logger.error(f"{len(batch)} rows could not be written: {e}")
+            return
+        self.lastFlushMs = (time.perf_counter() - started) * 1000
+        self.maxFlushMs = max(self.maxFlushMs, self.lastFlushMs)
+        self.rowsWritten += len(batch)
+        self.flushes += 1
+        if self.onFlush is not None:
+            self.onFlush(len(batch))
+
+    def run(self) -> None:
+        db = DB()
+        db.connect()
+        nextMaintenance = time.perf_counter()
+        while not self._stopEvent.is_set():
+            batch, job = self._take(self.flushInterval)
+            if batch:
+                self._flush(db, batch)
+            if job:
+                self._runJob(db, job)
+            if self.maintenance is not None and time.perf_counter() >= nextMaintenance:
+                nextMaintenance = time.perf_counter() + self.maintenanceInterval
+                try:
+                    self.maintenance(db)
+                except Exception as e:
+                    # A failed run must not stop the writer, the next one retries
+                    db.conn.rollback()
+                    logger.error(f"Database maintenance failed: {e}")
+        while True:
+            batch, job = self._take(0)
+            if not batch and not job:
+                break
+            if batch:
+                self._flush(db, batch)
+            if job:
+                self._runJob(db, job)
+        db.conn.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stopEvent.set()
+        self.join(timeout)
+        logger.info(f"DB writer closed, {self.rowsWritten} rows written")
+
+
+class ConnectionManager:
+    """One writer thread and a pool of read-only WAL reader connections.
+
+    `reader()` lends a connection to the calling thread, nested calls in the
+    same thread get the same one. Readers never wait for the writer, only for
+    a free connection, and that wait is measured.
+    """
+
+    def __init__(self, readers: int = 4) -> None:
+        self.size = readers
+        self.writer: DBWriter | None = None
+        self._pool = queue.Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.waits = 0
+        self.waitMs = 0.0
+        self.maxWaitMs = 0.0
+
+    def startWriter(self, **kwargs) -> DBWriter:
+        self.writer = DBWriter(**kwargs)
+        self.writer.start()
+        return self.writer
+
+    def write(self, fn) -> Future:
+        if self.writer is None:
+            raise RuntimeError("The database writer is not started")
+        return self.writer.submit(fn)
+
+    def _openReader(self) -> DB:
+        if self._opened == 0:
+            # The schema has to exist before a read-only connection sees it
+            db = DB()
+            db.connect()
+            db.conn.close()
+        db = DB()
+        db.connect(readonly=True)
+        self._opened += 1
+        return db
+
+    def _acquire(self) -> DB:
+        with self._lock:
+            if self._pool.empty() and self._opened < self.size:
+                return self._openReader()
+        started = time.perf_counter()
+        db = self._pool.get()
+        waited = (time.perf_counter() - started) * 1000
+        self.waits += 1
+        self.waitMs += waited
+        self.maxWaitMs = max(self.maxWaitMs, waited)
+        return db
+
+    @contextmanager
+    def reader(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            yield db
+            return
+        db = self._local.db = self._acquire()
+        try:
+            yield db
+        finally:
+            # End the read transaction so the WAL can be checkpointed
+            db.conn.rollback()
+            self._local.db = None
+            self._pool.put(db)
+
+    def stats(self) -> dict:
+        stats = {
+            "readers": self._opened,
+            "readersIdle": self._pool.qsize(),
+            "readerWaits": self.waits,
+            "avgReaderWaitMs": round(self.waitMs / max(1, self.waits), 1),
+            "maxReaderWaitMs": round(self.maxWaitMs, 1),
+        }
+        if self.writer is not None:
+            stats.update(self.writer.stats())
+        return stats
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        while not self._pool.empty():
+            self._pool.get_nowait().conn.close()
+        self._opened = 0
+
+
+connections = ConnectionManager()
+
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or maintain the database")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="recompute the minute and hour rollups from the raw rows")
+    args = parser.parse_args()
+
     db = DB()
     db.connect()
-    data = db.fetchAll()
-    print(data)
+    if args.rebuild_rollups:
+        db.rebuildRollups()
+        logger.info("Rollups rebuilt")
+    else:
+        data = db.fetchAll()
+        print(data)
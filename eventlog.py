@@ -0,0 +1,252 @@
+"""Append-only binary event log as a fast ingestion sink.
+
+Usage:
+    python eventlog.py            compact every remaining segment into infos
+
+Detections are written as fixed-width records into memory-mapped segment
+files of `eventlog/`. A record is the epoch timestamp, camera, age and gender
+codes and a CRC32 of these, so a torn write at the end of a segment is simply
+where the segment ends. Full or old segments are sealed and bulk-loaded into
+`infos` by `LogCompactor`, every loaded segment is recorded in the
+`eventlog_compacted` table in the same transaction and then deleted. Segments
+left over after a crash are replayed the same way on the next start.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from datetime import datetime
+
+from db import DB, connections, toEpoch
+from logger import logger
+
+RECORD = struct.Struct("<qHBB")
+RECORD_SIZE = RECORD.size + 4
+
+
+def packRecord(ts: int, cam: int, age: int, gender: int) -> bytes:
+    body = RECORD.pack(ts, cam, age, gender)
+    return body + zlib.crc32(body).to_bytes(4, "little")
+
+
+def unpackRecords(buffer) -> list[tuple]:
+    records = []
+    for offset in range(0, len(buffer) - RECORD_SIZE + 1, RECORD_SIZE):
+        body = buffer[offset:offset + RECORD.size]
+        crc = int.from_bytes(buffer[offset + RECORD.size:offset + RECORD_SIZE], "little")
+        if zlib.crc32(body) != crc:
+            # Unwritten space or a record torn by a crash
+            break
+        records.append(RECORD.unpack(body))
+    return records
+
+
+def readSegment(path: str) -> list[tuple]:
+    with open(path, "rb") as f:
+        return unpackRecords(f.read())
+
+
+class LabelEncoder:
+    """Caches the lookup codes of rows, new labels are added by the writer."""
+
+    def __init__(self) -> None:
+        self.codes: dict[tuple, tuple] = {}
+
+    def encode(self, d: dict) -> tuple:
+        key = (d["cam"], d["age"], d["gender"])
+        codes = self.codes.get(key)
+        if codes is None:
+            def lookup(db: DB) -> tuple:
+                cam, age, gender, _ = db.encode(d)
+                db.conn.commit()
+                return cam, age, gender
+            codes = self.codes[key] = connections.write(lookup).result()
+        return codes
+
+
+class EventLog:
+    def __init__(self, directory: str = "eventlog", segmentRecords: int = 65536,
+                 encoder: LabelEncoder | None = None) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segmentRecords = segmentRecords
+        self.encoder = encoder or LabelEncoder()
+        self._lock = threading.Lock()
+        # Everything found on disk is from an earlier run and only replayed
+        self.sealed = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith("segment-") and name.endswith(".log"))
+        self.appended = 0
+        self._closed = False
+        self._open()
+        if self.sealed:
+            logger.info(f"{len(self.sealed)} event log segments to replay")
+
+    def _open(self) -> None:
+        self.activePath = os.path.join(self.directory, f"segment-{time.time_ns():020d}.log")
+        with open(self.activePath, "wb") as f:
+            f.truncate(self.segmentRecords * RECORD_SIZE)
+        self._file = open(self.activePath, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), self.segmentRecords * RECORD_SIZE)
+        self._count = 0
+        self._openedAt = time.perf_counter()
+
+    def _close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+    def _seal(self) -> None:
+        self._close()
+        self.sealed.append(self.activePath)
+        self._open()
+
+    def append(self, data: list[dict]) -> None:
+        now = datetime.now()
+        records = [
+            packRecord(toEpoch(d.get("datetime") or now), *self.encoder.encode(d))
+            for d in data
+        ]
+        with self._lock:
+            for record in records:
+                if self._count == self.segmentRecords:
+                    self._seal()
+                offset = self._count * RECORD_SIZE
+                self._map[offset:offset + RECORD_SIZE] = record
+                self._count += 1
+            self.appended += len(records)
+
+    def rotate(self, maxSeconds: float) -> None:
+        # Seals the active segment once it is old enough, so it gets compacted
+        with self._lock:
+            if self._count and time.perf_counter() - self._openedAt >= maxSeconds:
+                self._seal()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._map.flush()
+
+    def sealedSegments(self) -> list[str]:
+        with self._lock:
+            return list(self.sealed)
+
+    def markCompacted(self, path: str) -> None:
+        with self._lock:
+            self.sealed.remove(path)
+        os.remove(path)
+
+    def pending(self) -> dict[str, list[tuple]]:
+        """Records which may not be in infos yet, as (ts, cam, age, gender) per
+        segment name. The caller drops segments listed in eventlog_compacted."""
+        with self._lock:
+            paths = list(self.sealed)
+            # After close the active segment is sealed and read from its file
+            segments = {} if self._closed else {
+                os.path.basename(self.activePath):
+                    unpackRecords(self._map[:self._count * RECORD_SIZE])}
+        for path in paths:
+            try:
+                segments[os.path.basename(path)] = readSegment(path)
+            except FileNotFoundError:
+                # Compacted and deleted meanwhile
+                pass
+        return segments
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._close()
+            self._closed = True
+            if self._count:
+                self.sealed.append(self.activePath)
+            else:
+                os.remove(self.activePath)
+
+
+def compactSegment(db: DB, path: str) -> int:
+    name = os.path.basename(path)
+    db.cursor.execute(
+        "CREATE TABLE IF NOT EXISTS eventlog_compacted(segment TEXT PRIMARY KEY, rows INTEGER)")
+    if db.cursor.execute(
+            "SELECT 1 FROM eventlog_compacted WHERE segment = ?", (name,)).fetchone():
+        # Loaded before a crash, only the file was left behind
+        db.conn.commit()
+        return 0
+    records = readSegment(path)
+    db.cursor.executemany(
+        "INSERT INTO infos(ts, cam, age, gender) VALUES(?, ?, ?, ?)", records)
+    db.cursor.execute(
+        "INSERT INTO eventlog_compacted(segment, rows) VALUES(?, ?)", (name, len(records)))
+    db.conn.commit()
+    return len(records)
+
+
+class LogCompactor(threading.Thread):
+    """Bulk-loads sealed segments into infos through the database writer.
+
+    The active segment is sealed after `maxSegmentSeconds`, so rows reach
+    infos within about `interval + maxSegmentSeconds` even at low rates.
+    """
+
+    def __init__(self, log: EventLog, interval: float = 5.0,
+                 maxSegmentSeconds: float = 30.0, onCompact=None) -> None:
+        super().__init__(name="eventlog-compactor", daemon=True)
+        self.log = log
+        self.interval = interval
+        self.maxSegmentSeconds = maxSegmentSeconds
+        self.onCompact = onCompact
+        self.compacted = 0
+        self._stopEvent = threading.Event()
+
+    def compact(self) -> int:
+        count = 0
+        for path in self.log.sealedSegments():
+            count += connections.write(lambda db: compactSegment(db, path)).result()
+            self.log.markCompacted(path)
+        self.compacted += count
+        if count and self.onCompact is not None:
+            self.onCompact(count)
+        return count
+
+    def run(self) -> None:
+        while not self._stopEvent.wait(self.interval):
+            self.log.rotate(self.maxSegmentSeconds)
+            self.log.flush()
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Event log compaction failed: {e}")
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._stopEvent.set()
+        self.join(timeout)
+        self.log.close()
+        self.compact()
+        logger.info(f"Event log closed, {self.compacted} rows compacted")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import getEventLogConfig
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=getEventLogConfig()["directory"],
+                        help="folder of the segment files")
+    args = parser.parse_args()
+
+    db = DB()
+    db.connect()
+    segments = sorted(name for name in os.listdir(args.dir)
+                      if name.startswith("segment-") and name.endswith(".log")) \
+        if os.path.isdir(args.dir) else []
+    total = 0
+    for name in segments:
+        path = os.path.join(args.dir, name)
+        total += compactSegment(db, path)
+        os.remove(path)
+    logger.info(f"{len(segments)} segments, {total} rows compacted")
@@ -0,0 +1,118 @@
+import os
+import time
+
+import inference
+from logger import logger
+
+# Operating points from best quality to cheapest:
+# (detector input scale, detection interval factor, classification refresh factor)
+LEVELS = [
+    (1.0, 1, 1),
+    (1.0, 2, 2),
+    (0.8, 2, 2),
+    (0.8, 3, 4),
+    (0.6, 4, 4),
+    (0.6, 6, 8),
+    (0.5, 8, 8),
+]
+
+
+class ThroughputGovernor:
+    """Holds a target inference FPS or CPU budget by trading quality.
+
+    `update` is called after every inference step with its duration. Once per
+    `period` it compares the measured rate and process CPU usage with the
+    targets and moves one operating point up or down. `pace` sleeps so the
+    inference loop does not run faster than the target FPS.
+    """
+
+    def __init__(self, targetFps: float = 0, targetCpu: float = 0,
+                 period: float = 2.0) -> None:
+        self.targetFps = targetFps
+        self.targetCpu = targetCpu
+        self.period = period
+        self.level = 0
+        self.fps = 0.0
+        self.cpu = 0.0
+        self.frameMs = 0.0
+        self.baseDetectSize = list(inference.profile["detectSize"])
+        self._frames = 0
+        self._busy = 0.0
+        self._windowStart = time.perf_counter()
+        self._cpuStart = time.process_time()
+
+    @property
+    def enabled(self) -> bool:
+        return self.targetFps > 0 or self.targetCpu > 0
+
+    def operatingPoint(self) -> dict:
+        scale, detectFactor, refreshFactor = LEVELS[self.level]
+        return {
+            "level": self.level,
+            "detectSize": inference.profile["detectSize"],
+            "detectFactor": detectFactor,
+            "refreshFactor": refreshFactor,
+            "fps": round(self.fps, 1),
+            "cpu": round(self.cpu, 1),
+            "frameMs": round(self.frameMs, 1),
+        }
+
+    def apply(self, channels) -> None:
+        if not self.enabled:
+            return
+        scale, detectFactor, refreshFactor = LEVELS[self.level]
+        inference.profile["detectSize"] = [
+            max(96, int(v * scale)) for v in self.baseDetectSize]
+        for channel in channels:
+            base = channel.baseConfig
+            channel.config["detectInterval"] = base["detectInterval"] * detectFactor
+            channel.config["classifyRefresh"] = base["classifyRefresh"] * refreshFactor
+
+    def decide(self) -> int:
+        # -1 is cheaper, +1 is better quality
+        if self.targetCpu > 0:
+            if self.cpu > self.targetCpu:
+                return -1
+            if self.cpu < self.targetCpu * 0.7 and \
+                    (self.targetFps <= 0 or self.fps >= self.targetFps * 0.95):
+                return 1
+        if self.targetFps > 0:
+            # The busy time tells what rate the current point could sustain
+            capacity = 1000 / self.frameMs if self.frameMs else 0
+            if capacity < self.targetFps * 0.9:
+                return -1
+            if capacity > self.targetFps * 1.5 and self.targetCpu <= 0:
+                return 1
+        return 0
+
+    def update(self, elapsed: float, channels, frames: int = 1) -> None:
+        if not self.enabled:
+            return
+        self._frames += frames
+        self._busy += elapsed
+        now = time.perf_counter()
+        window = now - self._windowStart
+        if window < self.period:
+            return
+
+        self.fps = self._frames / window
+        self.frameMs = self._busy * 1000 / max(1, self._frames)
+        self.cpu = 100 * (time.process_time() - self._cpuStart) / window \
+            / (os.cpu_count() or 1)
+        self._frames, self._busy = 0, 0.0
+        self._windowStart, self._cpuStart = now, time.process_time()
+
+        step = self.decide()
+        level = min(len(LEVELS) - 1, max(0, self.level - step))
+        if level != self.level:
+            self.level = level
+            self.apply(channels)
+            logger.info(
+                f"Governor moved to level {level} ({self.fps:.1f} fps, "
+                f"{self.cpu:.0f}% CPU, {self.frameMs:.1f} ms/frame): {self.operatingPoint()}")
+
+    def pace(self, elapsed: float, frames: int = 1) -> None:
+        if self.targetFps > 0:
+            delay = frames / self.targetFps - elapsed
+            if delay > 0:
+                time.sleep(delay)
@@ -0,0 +1,243 @@
+from config import getProfile
+from logger import logger
+from models import models, ageList, genderList
+
+import cv2
+import numpy as np
+import time
+
+BACKENDS = {
+    "default": cv2.dnn.DNN_BACKEND_DEFAULT,
+    "opencv": cv2.dnn.DNN_BACKEND_OPENCV,
+    "cuda": getattr(cv2.dnn, "DNN_BACKEND_CUDA", cv2.dnn.DNN_BACKEND_DEFAULT),
+}
+TARGETS = {
+    "cpu": cv2.dnn.DNN_TARGET_CPU,
+    "opencl": cv2.dnn.DNN_TARGET_OPENCL,
+    "opencl_fp16": cv2.dnn.DNN_TARGET_OPENCL_FP16,
+    "cuda": getattr(cv2.dnn, "DNN_TARGET_CUDA", cv2.dnn.DNN_TARGET_CPU),
+    "cuda_fp16": getattr(cv2.dnn, "DNN_TARGET_CUDA_FP16", cv2.dnn.DNN_TARGET_CPU),
+}
+
+profile: dict = {}
+# Moving average of the detector time per blob, used to size the tile grid
+detectorCost = {"ms": 10.0}
+
+
+def setProfile(newProfile: dict) -> None:
+    # Sizes and thresholds are read on every call, backend and input sizes
+    # need the nets to be reloaded.
+    profile.clear()
+    profile.update(newProfile)
+    cv2.setNumThreads(int(profile["threads"]) or cv2.getNumberOfCPUs())
+    models.configure(
+        backend=BACKENDS[profile["backend"]],
+        target=TARGETS[profile["target"]],
+        sizes={
+            "face": tuple(profile["detectSize"]),
+            "age": tuple(profile["classifySize"]),
+            "gender": tuple(profile["classifySize"]),
+        }
+    )
+    logger.info(f"Inference profile '{profile.get('name')}' applied")
+
+
+def decodeDetections(detection, frameSizes) -> list[list]:
+    # Decodes the SSD output of a whole batch in one go: confidence masking,
+    # scaling and clipping are done with NumPy, then per image NMS and the
+    # minimum face size filter drop duplicates and noise.
+    rows = detection.reshape(-1, 7)
+    rows = rows[rows[:, 2] > profile["confidence"]]
+    imageIds = rows[:, 0].astype(np.int32)
+    bboxes = [[] for _ in frameSizes]
+    if len(rows) == 0:
+        return bboxes
+
+    scale = np.array([(w, h, w, h) for h, w in frameSizes], dtype=np.float32)
+    boxes = rows[:, 3:7] * scale[imageIds]
+    limits = scale[imageIds] - 1
+    boxes = np.clip(boxes, 0, limits).astype(np.int32)
+
+    sides = np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    keep = sides >= profile["minFaceSize"]
+    boxes, scores, imageIds = boxes[keep], rows[keep, 2], imageIds[keep]
+
+    for imageId in np.unique(imageIds):
+        mask = imageIds == imageId
+        imageBoxes, imageScores = boxes[mask], scores[mask]
+        rects = np.column_stack(
+            (imageBoxes[:, :2], imageBoxes[:, 2:] - imageBoxes[:, :2]))
+        indices = cv2.dnn.NMSBoxes(
+            rects.tolist(), imageScores.tolist(),
+            profile["confidence"], profile["nmsThreshold"])
+        bboxes[imageId] = imageBoxes[np.array(indices, dtype=np.int32).ravel()].tolist()
+    return bboxes
+
+
+def faceBox(faceNet, frame):
+    blob = cv2.dnn.blobFromImage(frame, 1.0, tuple(profile["detectSize"]), [
+                                 104, 117, 123], swapRB=False)
+    faceNet.setInput(blob)
+    detection = faceNet.forward()
+    bboxs = decodeDetections(detection, [frame.shape[:2]])[0]
+
+    return frame, bboxs
+
+
+def faceBoxes(faceNet, frames) -> list[list]:
+    # The bundled TF SSD graph only accepts a batch of one image, so every
+    # frame gets its own forward pass
+    return [faceBox(faceNet, frame)[1] for frame in frames]
+
+
+def regionCrops(frame, rois) -> list[tuple]:
+    # ROIs are given in relative coordinates, either as rectangles
+    # [x1, y1, x2, y2] or as polygons [[x, y], ...]. Detection runs on the
+    # bounding rectangle of each one.
+    h, w = frame.shape[:2]
+    if not rois:
+        return [(frame, (0, 0), None)]
+    regions = []
+    for roi in rois:
+        if isinstance(roi[0], (list, tuple)):
+            polygon = (np.array(roi, dtype=np.float32) * (w, h)).astype(np.float32)
+            x1, y1 = polygon.min(axis=0)
+            x2, y2 = polygon.max(axis=0)
+        else:
+            polygon = None
+            x1, y1, x2, y2 = np.array(roi, dtype=np.float32) * (w, h, w, h)
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(x2)), min(h, int(y2))
+        if x2 - x1 > 1 and y2 - y1 > 1:
+            regions.append((frame[y1:y2, x1:x2], (x1, y1), polygon))
+    return regions
+
+
+def tileGrid(frameSize) -> tuple[int, int]:
+    h, w = frameSize
+    if profile["tiling"] == "fixed":
+        return tuple(profile["tileGrid"])
+    # Aim for tiles about three detector inputs wide, then shrink the grid
+    # until the estimated cost fits into the time budget.
+    target = 3 * profile["detectSize"][0]
+    cols, rows = max(1, round(w / target)), max(1, round(h / target))
+    while cols * rows > 1 and \
+            (cols * rows + 1) * detectorCost["ms"] > profile["tileBudgetMs"]:
+        if cols >= rows:
+            cols -= 1
+        else:
+            rows -= 1
+    return cols, rows
+
+
+def tileRegions(regions) -> list[tuple]:
+    # Each region is kept whole for near faces and additionally split into
+    # overlapping tiles so far away faces get enough detector pixels.
+    if profile["tiling"] == "off":
+        return regions
+    tiled = []
+    for crop, (ox, oy), polygon in regions:
+        tiled.append((crop, (ox, oy), polygon))
+        h, w = crop.shape[:2]
+        cols, rows = tileGrid((h, w))
+        if cols * rows <= 1:
+            continue
+        overlap = profile["tileOverlap"]
+        tileW = int(w / (cols - (cols - 1) * overlap))
+        tileH = int(h / (rows - (rows - 1) * overlap))
+        for row in range(rows):
+            for col in range(cols):
+                x1 = min(w - tileW, int(col * tileW * (1 - overlap)))
+                y1 = min(h - tileH, int(row * tileH * (1 - overlap)))
+                tiled.append((crop[y1:y1 + tileH, x1:x1 + tileW],
+                              (ox + x1, oy + y1), polygon))
+    return tiled
+
+
+def mergeRegionBoxes(regions, regionBoxes) -> list:
+    bboxes, scores = [], []
+    for (_, (ox, oy), polygon), boxes in zip(regions, regionBoxes):
+        for x1, y1, x2, y2 in boxes:
+            box = [x1 + ox, y1 + oy, x2 + ox, y2 + oy]
+            if polygon is not None:
+                center = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+                if cv2.pointPolygonTest(polygon, center, False) < 0:
+                    continue
+            bboxes.append(box)
+            scores.append(float((box[2] - box[0]) * (box[3] - box[1])))
+    if len(regions) < 2 or not bboxes:
+        return bboxes
+    # Overlapping regions and tiles may find the same face twice, the larger
+    # box wins as a face cut by a tile border only yields a partial one
+    rects = [[x1, y1, x2 - x1, y2 - y1] for x1, y1, x2, y2 in bboxes]
+    indices = cv2.dnn.NMSBoxes(rects, scores, 0.0, profile["nmsThreshold"])
+    return [bboxes[i] for i in np.array(indices, dtype=np.int32).ravel()]
+
+
+def timedFaceBoxes(faceNet, crops) -> list[list]:
+    started = time.perf_counter()
+    boxes = faceBoxes(faceNet, crops)
+    ms = (time.perf_counter() - started) * 1000 / len(crops)
+    detectorCost["ms"] = 0.8 * detectorCost["ms"] + 0.2 * ms
+    return boxes
+
+
+def detectFaces(faceNet, frame, rois=None) -> list:
+    regions = tileRegions(regionCrops(frame, rois))
+    if not regions:
+        return []
+    regionBoxes = timedFaceBoxes(faceNet, [crop for crop, _, _ in regions])
+    return mergeRegionBoxes(regions, regionBoxes)
+
+
+MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
+
+
+def cropFace(frame, bbox):
+    padding = profile["padding"]
+    return frame[
+        max(0, bbox[1]-padding):min(bbox[3]+padding, frame.shape[0]-1),
+        max(0, bbox[0]-padding):min(bbox[2]+padding, frame.shape[1]-1)
+    ]
+
+
+def predictCrops(faces) -> tuple:
+    blob = cv2.dnn.blobFromImages(
+        faces, 1.0, tuple(profile["classifySize"]), MODEL_MEAN_VALUES, swapRB=False)
+    genderNet = models.get("gender")
+    genderNet.setInput(blob)
+    genderPreds = genderNet.forward()
+    ageNet = models.get("age")
+    ageNet.setInput(blob)
+    agePreds = ageNet.forward()
+    return agePreds, genderPreds
+
+
+def predictFaces(frame, bboxes) -> list[tuple | None]:
+    # All crops of a frame go through the networks as one batch, so a crowded
+    # frame costs two forward passes instead of two per face.
+    preds: list[tuple | None] = [None] * len(bboxes)
+    faces, indices = [], []
+    for i, bbox in enumerate(bboxes):
+        face = cropFace(frame, bbox)
+        if face.size > 0:
+            faces.append(face)
+            indices.append(i)
+    if not faces:
+        return preds
+
+    agePreds, genderPreds = predictCrops(faces)
+    for i, agePred, genderPred in zip(indices, agePreds, genderPreds):
+        preds[i] = (agePred, genderPred)
+    return preds
+
+
+def classifyFaces(frame, bboxes) -> list[tuple[str, str] | None]:
+    return [
+        (ageList[pred[0].argmax()], genderList[pred[1].argmax()])
+        if pred is not None else None
+        for pred in predictFaces(frame, bboxes)
+    ]
+
+
+setProfile(getProfile())
@@ -0,0 +1,185 @@
+"""Headless batch ingestion of recorded footage into the infos table.
+
+Usage:
+    python ingest.py recordings/*.mp4 snapshots/ --cam 3 --every 1.0
+
+Video files are split into segments and image folders into chunks, which are
+processed on a process pool. Finished tasks are recorded in the
+`ingest_progress` table in the same transaction as their rows, so an
+interrupted run can simply be started again.
+"""
+import argparse
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from db import DB
+from logger import logger
+from sources import IMAGE_EXTENSIONS
+
+
+def videoTasks(path: str, segmentSeconds: float, start: datetime | None) -> list[dict]:
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if frameCount <= 0:
+        logger.warning(f"Skipping unreadable video: {path}")
+        return []
+
+    if start is None:
+        # Assume the file was closed when the recording ended
+        start = datetime.fromtimestamp(os.path.getmtime(path)) \
+            - timedelta(seconds=frameCount / fps)
+    segmentFrames = max(1, int(segmentSeconds * fps))
+    return [
+        {
+            "id": f"{os.path.abspath(path)}:{first}",
+            "kind": "video",
+            "path": path,
+            "first": first,
+            "last": min(first + segmentFrames, frameCount),
+            "fps": fps,
+            "start": start,
+        }
+        for first in range(0, frameCount, segmentFrames)
+    ]
+
+
+def imageTasks(folder: str, chunkSize: int) -> list[dict]:
+    files = sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return [
+        {
+            "id": f"{os.path.abspath(folder)}:{i}",
+            "kind": "images",
+            "files": files[i:i + chunkSize],
+        }
+        for i in range(0, len(files), chunkSize)
+    ]
+
+
+def analyzeFrame(frame, cam: int, dt: datetime) -> list[dict]:
+    from inference import faceBox, classifyFaces
+    from models import models
+
+    _, bboxes = faceBox(models.get("face"), frame)
+    return [
+        {"cam": cam, "age": age, "gender": gender, "datetime": dt}
+        for age, gender in filter(None, classifyFaces(frame, bboxes))
+    ]
+
+
+def initWorker(threads: int) -> None:
+    # Every worker would otherwise run cv2 on all CPUs and oversubscribe them
+    from config import getProfile
+    from inference import setProfile
+
+    setProfile({**getProfile(), "threads": threads})
+
+
+def runTask(task: dict, cam: int, every: float) -> tuple[str, list[dict], int]:
+    import cv2
+
+    rows, frames = [], 0
+    if task["kind"] == "video":
+        cap = cv2.VideoCapture(task["path"])
+        cap.set(cv2.CAP_PROP_POS_FRAMES, task["first"])
+        step = max(1, int(round(every * task["fps"])))
+        for frameNo in range(task["first"], task["last"]):
+            # grab() skips decoding of the frames in between samples
+            if frameNo % step:
+                if not cap.grab():
+                    break
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames += 1
+            dt = task["start"] + timedelta(seconds=frameNo / task["fps"])
+            rows += analyzeFrame(frame, cam, dt)
+        cap.release()
+    else:
+        for path in task["files"]:
+            frame = cv2.imread(path)
+            if frame is None:
+                continue
+            frames += 1
+            dt = datetime.fromtimestamp(os.path.getmtime(path))
+            rows += analyzeFrame(frame, cam, dt)
+    return task["id"], rows, frames
+
+
+def completedTasks(db: DB) -> set[str]:
+    db.cursor.execute(
+        "CREATE TABLE IF NOT EXISTS ingest_progress(task TEXT PRIMARY KEY, finished TEXT)")
+    db.conn.commit()
+    return {row[0] for row in db.cursor.execute("SELECT task FROM ingest_progress")}
+
+
+def ingest(paths: list[str], cam: int, every: float, segmentSeconds: float,
+           chunkSize: int, workers: int | None, start: datetime | None) -> None:
+    db = DB()
+    db.connect()
+
+    tasks = []
+    for path in paths:
+        if os.path.isdir(path):
+            tasks += imageTasks(path, chunkSize)
+        else:
+            tasks += videoTasks(path, segmentSeconds, start)
+
+    done = completedTasks(db)
+    pending = [task for task in tasks if task["id"] not in done]
+    logger.info(
+        f"{len(tasks)} tasks found, {len(tasks) - len(pending)} already ingested")
+
+    startedAt = time.perf_counter()
+    totalFrames = totalRows = 0
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                             initargs=(threads,)) as executor:
+        futures = [executor.submit(runTask, task, cam, every) for task in pending]
+        for i, future in enumerate(as_completed(futures), 1):
+            taskId, rows, frames = future.result()
+            db.insertMany(rows, commit=False)
+            db.cursor.execute(
+                "INSERT INTO ingest_progress(task, finished) VALUES(?, ?)",
+                (taskId, datetime.now()))
+            db.conn.commit()
+
+            totalFrames += frames
+            totalRows += len(rows)
+            elapsed = time.perf_counter() - startedAt
+            logger.info(
+                f"[{i}/{len(pending)}] {totalFrames} frames, {totalRows} rows, "
+                f"{totalFrames / elapsed:.1f} fps")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+",
+                        help="video files or folders of images")
+    parser.add_argument("--cam", type=int, default=0,
+                        help="camera index stored with the rows")
+    parser.add_argument("--every", type=float, default=1.0,
+                        help="seconds of video between analyzed frames")
+    parser.add_argument("--segment", type=float, default=60.0,
+                        help="seconds of video per task")
+    parser.add_argument("--chunk", type=int, default=64,
+                        help="images per task")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None,
+                        help="recording start time of the videos (ISO format)")
+    args = parser.parse_args()
+
+    ingest(args.paths, args.cam, args.every, args.segment,
+           args.chunk, args.workers, args.start)
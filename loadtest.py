@@ -0,0 +1,52 @@
+"""Run the detection pipeline headless on replayed or synthetic sources.
+
+Usage:
+    QT_QPA_PLATFORM=offscreen python loadtest.py "synthetic?faces=8&realtime=0&frames=600"
+    python loadtest.py file:clips/lobby.mp4?realtime=0 --processes 4 --seconds 60
+
+Prints the detector statistics as JSON when the sources end or the time is up.
+"""
+import argparse
+import json
+import sys
+import time
+
+from PyQt6.QtCore import QCoreApplication, QTimer
+
+from multicam import MultiCameraDetector
+from sources import sourceSpec
+
+
+def loadtest(sources: list, seconds: float, processes: int) -> dict:
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    detector = MultiCameraDetector(sources, processes=processes)
+    rows = []
+    detector.result.connect(lambda data: rows.append(len(data)))
+    detector.finished.connect(app.quit)
+    # The preview is not shown, keep it from costing anything
+    detector.setPreviewFps(1)
+
+    started = time.perf_counter()
+    QTimer.singleShot(int(seconds * 1000), detector.stop)
+    detector.start()
+    app.exec()
+    elapsed = time.perf_counter() - started
+
+    stats = detector.pipelineStats()
+    stats["seconds"] = round(elapsed, 2)
+    stats["fps"] = round(stats.get("rendered", 0) / elapsed, 1)
+    stats["meanFaces"] = round(sum(rows) / max(1, len(rows)), 2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sources", type=sourceSpec, nargs="+",
+                        help="camera indexes or frame source specs")
+    parser.add_argument("--seconds", type=float, default=30.0,
+                        help="stop after this many seconds")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="run inference on this many worker processes")
+    args = parser.parse_args()
+
+    print(json.dumps(loadtest(args.sources, args.seconds, args.processes), indent=4))
@@ -4,27 +4,60 @@ from PyQt6.QtGui import *
 
 from app_ui import Ui_MainWindow
 from reporting import ReportWindow
+from tablemodel import DetectionTableModel
 from utils import FaceDetector
+from multicam import MultiCameraDetector
+from inference import setProfile
+from config import getProfile, getRetentionConfig, getEventLogConfig
+from eventlog import EventLog, LogCompactor
+from retention import applyRetention, clearArchive, fetchWithArchive
+from sources import sourceSpec, sourceSortKey
+from cameras import CameraScanner, cachedCameras, capturePool
 from logger import logger
 
-from db import DB
+from db import connections, setPendingLog
 
 import sys
 import pandas as pd
 
 
 class MainWindow(QMainWindow, Ui_MainWindow):
-    def __init__(self) -> None:
+    dataFlushed = pyqtSignal(int)
+    databaseCleared = pyqtSignal()
+
+    def __init__(self, cameraIndexes: list[int] | None = None, processes: int = 0) -> None:
         super().__init__()
         self.setupUi(self)
+        self.tableModel = DetectionTableModel(self)
+        self.table.setModel(self.tableModel)
 
-        self.db = DB()
+        retention = getRetentionConfig()
+        self.retention = (lambda db: applyRetention(db, **retention)) \
+            if retention["rawDays"] > 0 else None
         self.timer = QTimer(self)
-        self.detectorThread = FaceDetector(self)
+        if processes and not cameraIndexes:
+            cameraIndexes = [0]
+        self.cameraIndexes = cameraIndexes
+        if cameraIndexes:
+            self.detectorThread = MultiCameraDetector(cameraIndexes, self, processes)
+        else:
+            self.detectorThread = FaceDetector(self)
 
         self.currentData = None
 
-        self.db.connect()
+        self.dbWriter = connections.startWriter(
+            onFlush=self.dataFlushed.emit, maintenance=self.retention)
+        self.eventLog = self.compactor = None
+        self.cameraScanner = None
+        eventLogConfig = getEventLogConfig()
+        if eventLogConfig["enabled"]:
+            self.eventLog = EventLog(
+                eventLogConfig["directory"], eventLogConfig["segmentRecords"])
+            setPendingLog(self.eventLog)
+            self.compactor = LogCompactor(
+                self.eventLog, eventLogConfig["compactInterval"],
+                eventLogConfig["maxSegmentSeconds"], onCompact=self.dataFlushed.emit)
+            self.compactor.start()
 
         self.initSlotSignal()
         self.loadCameras()
@@ -35,13 +68,18 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def initSlotSignal(self):
         self.statusLabel = QLabel("Ready")
         self.statusbar.addWidget(self.statusLabel)
+        self.pipelineLabel = QLabel()
+        self.statusbar.addPermanentWidget(self.pipelineLabel)
 
         self.timer.timeout.connect(self.saveData)
+        self.dataFlushed.connect(self.onDataFlushed)
+        self.databaseCleared.connect(self.loadData)
 
-        self.detectorThread.changePixmap.connect(self.displayFrame)
+        self.detectorThread.previewReady.connect(self.displayFrame)
         self.detectorThread.status.connect(self.cameraLabel.setText)
         self.detectorThread.status.connect(self.statusLabel.setText)
         self.detectorThread.result.connect(self.setCurrentData)
+        self.detectorThread.stats.connect(self.showPipelineStats)
 
         self.camerasCombobox.currentIndexChanged.connect(self.changeCamera)
 
@@ -73,29 +111,72 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         )
 
     def loadCameras(self):
-        # TODO: Implement logic to list available cameras
-        cameraList = [0, 1, 2]
-        for cam in cameraList:
-            self.camerasCombobox.addItem(f"CAM {cam}", cam)
+        if self.cameraIndexes:
+            for cam in self.cameraIndexes:
+                self.addCamera({"index": cam})
+            return
 
-    def displayFrame(self, frame: QImage):
-        self.cameraLabel.setPixmap(QPixmap.fromImage(frame))
+        # The last entry asks for a file or synthetic source instead
+        self.camerasCombobox.blockSignals(True)
+        self.camerasCombobox.addItem("Open source...", None)
+        self.camerasCombobox.blockSignals(False)
+
+        # Cached devices are shown right away, the scan fills in the rest
+        self.addCamera({"index": self.detectorThread.cameraIndex})
+        for info in cachedCameras():
+            self.addCamera(info)
+        self.cameraScanner = CameraScanner(
+            skip={self.detectorThread.cameraIndex}, parent=self)
+        self.cameraScanner.found.connect(self.addCamera)
+        self.cameraScanner.start()
+
+    def addCamera(self, info: dict):
+        cam = info["index"]
+        if self.camerasCombobox.findData(cam) != -1:
+            return
+        position = sum(
+            1 for i in range(self.camerasCombobox.count())
+            if self.camerasCombobox.itemData(i) is not None
+            and sourceSortKey(self.camerasCombobox.itemData(i)) < sourceSortKey(cam)
+        )
+        self.camerasCombobox.blockSignals(True)
+        self.camerasCombobox.insertItem(position, f"CAM {cam}", cam)
+        if cam == self.detectorThread.cameraIndex:
+            self.camerasCombobox.setCurrentIndex(position)
+        self.camerasCombobox.blockSignals(False)
+
+        formats = info.get("formats", [])
+        if formats:
+            tooltip = "\n".join(
+                f"{f['fourcc']} {f['width']}x{f['height']} @ {f['fps']}" for f in formats)
+            self.camerasCombobox.setItemData(
+                position, tooltip, Qt.ItemDataRole.ToolTipRole)
+
+    def displayFrame(self):
+        frame = self.detectorThread.takePreview()
+        if frame is not None:
+            self.cameraLabel.setPixmap(QPixmap.fromImage(frame))
+
+    def resizeEvent(self, a0: QResizeEvent | None) -> None:
+        super().resizeEvent(a0)
+        size = self.cameraLabel.contentsRect().size()
+        self.detectorThread.setPreviewSize(size.width(), size.height())
+
+    def showPipelineStats(self, stats: dict):
+        idle = 100 * stats["gateSkipped"] / max(1, stats["gateFrames"])
+        self.pipelineLabel.setText(
+            f"Dropped {stats['captureDropped']}/{stats['captured']} | "
+            f"Latency {stats['latencyMs']} ms | "
+            f"Gate idle {idle:.0f}% (motion {stats['motion']:.1f}%) | "
+            f"Level {stats['governor']['level']}"
+        )
 
     def clearTable(self):
-        self.table.setRowCount(0)
+        self.tableModel.clear()
 
     def loadData(self):
-        self.clearTable()
-        result = self.db.fetchAll()
-        for i, c, a, g, d in result:
-            rowPos = self.table.rowCount()
-            self.table.insertRow(rowPos)
-
-            self.table.setItem(rowPos, 0, QTableWidgetItem(str(i)))
-            self.table.setItem(rowPos, 1, QTableWidgetItem(str(a)))
-            self.table.setItem(rowPos, 2, QTableWidgetItem(str(g)))
-            self.table.setItem(rowPos, 3, QTableWidgetItem(str(d)))
-            self.table.setItem(rowPos, 4, QTableWidgetItem(str(c)))
+        # Only the first page, the view fetches more while scrolling
+        self.tableModel.reset()
         logger.info("Data loaded successfully")
 
     def setCurrentData(self, data: list):
@@ -104,7 +185,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def toggleCamera(self):
         self.stopGathering()
         if self.detectorThread.isRunning():
-            self.detectorThread.terminate()
+            self.detectorThread.stop()
+            # Captures are only kept warm for switching, closing frees the device
+            for cam in self.cameraIndexes or [self.detectorThread.cameraIndex]:
+                capturePool.discard(cam)
             self.detectorThread.setDetect(False)
             self.cameraLabel.clear()
             self.cameraLabel.setText("Camera closed")
@@ -115,12 +199,43 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.startButton.setDisabled(False)
 
     def changeCamera(self, value: int):
-        if self.detectorThread.isRunning():
-            self.detectorThread.terminate()
-        self.detectorThread.setCameraIndex(value)
-        self.detectorThread.start()
+        cam = self.camerasCombobox.itemData(value)
+        if cam is None:
+            self.openSource()
+            return
+        if self.cameraIndexes:
+            self.detectorThread.setCameraIndex(cam)
+            return
+        self.detectorThread.switchCamera(cam)
         self.stopGathering()
 
+    def openSource(self):
+        text, ok = QInputDialog.getText(
+            self, "Open Source",
+            "Camera index, file:path/to/video.mp4 or synthetic?faces=4")
+        if not ok or not text.strip():
+            # Back to the running camera without restarting it
+            self.camerasCombobox.blockSignals(True)
+            self.camerasCombobox.setCurrentIndex(
+                self.camerasCombobox.findData(self.detectorThread.cameraIndex))
+            self.camerasCombobox.blockSignals(False)
+            return
+        spec = sourceSpec(text.strip())
+        self.addCamera({"index": spec})
+        # Selecting the entry switches the detector through changeCamera
+        self.camerasCombobox.setCurrentIndex(self.camerasCombobox.findData(spec))
+
+    def closeEvent(self, a0: QCloseEvent | None) -> None:
+        if self.cameraScanner is not None:
+            self.cameraScanner.requestInterruption()
+            self.cameraScanner.wait()
+        self.detectorThread.stop()
+        capturePool.closeAll()
+        if self.compactor is not None:
+            self.compactor.close()
+        connections.close()
+        a0.accept()
+
     def startGathering(self):
         if self.timer.isActive():
             return
@@ -151,11 +266,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if not self.currentData:
             return
 
-        for data in self.currentData:
-            self.db.insertData(data)
-
+        # Written in the background, new rows are added to the table after
+        # the flush or compaction
+        if self.eventLog is not None:
+            self.eventLog.append(self.currentData)
+        else:
+            self.dbWriter.enqueue(self.currentData)
         self.currentData = None
-        self.loadData()
+
+    def onDataFlushed(self, count: int):
+        stats = connections.stats()
+        if count:
+            self.statusbar.showMessage(
+                f"{count} rows saved | DB queue {stats['queueDepth']} | "
+                f"flush {stats['lastFlushMs']} ms | "
+                f"reader wait {stats['avgReaderWaitMs']} ms", 3000)
+        self.tableModel.refresh()
 
     def deleteDatabase(self):
         dlg = QMessageBox(self)
@@ -166,9 +292,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         dlg.setIcon(QMessageBox.Icon.Warning)
         button = dlg.exec()
         if button == QMessageBox.StandardButton.Yes:
-            self.db.clearDatabase()
+            # The table is reloaded once the writer has cleared it, archived
+            # rows would otherwise come back in every export
+            archiveDir = getRetentionConfig()["archiveDir"]
+            future = connections.write(
+                lambda db: (db.clearDatabase(), clearArchive(archiveDir)))
+            future.add_done_callback(lambda _: self.databaseCleared.emit())
             logger.info("Database deleted")
-            self.loadData()
 
     def dataToDataFrame(self):
         columns = [
@@ -178,7 +308,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             "Gender",
             "Datetime"
         ]
-        data = self.db.fetchAll()
+        # Archived days are part of every export
+        with connections.reader() as db:
+            data = fetchWithArchive(db)
         return pd.DataFrame(data, columns=columns)
 
     def exportAsExcel(self):
@@ -200,7 +332,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if not filepath:
             return
         data = self.dataToDataFrame()
-        data.to_sql(filepath, self.db.conn)
+        connections.write(lambda db: data.to_sql(filepath, db.conn)).result()
 
         self.statusbar.showMessage("Sql file exported successfully", 3000)
         QMessageBox.information(self, "Data exported",
@@ -253,7 +385,29 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cameras", type=sourceSpec, nargs="+",
+                        help="run these camera indexes or frame sources concurrently")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="run inference on this many worker processes")
+    parser.add_argument("--preview-fps", type=float, default=30.0,
+                        help="maximum preview frame rate")
+    parser.add_argument("--target-fps", type=float,
+                        help="inference FPS the governor should hold")
+    parser.add_argument("--target-cpu", type=float,
+                        help="CPU percentage the governor should stay under")
+    parser.add_argument("--profile",
+                        help="inference profile to use instead of the saved one")
+    args, qtArgs = parser.parse_known_args()
+
+    if args.profile:
+        setProfile(getProfile(args.profile))
+
+    app = QApplication(sys.argv[:1] + qtArgs)
+    window = MainWindow(args.cameras, args.processes)
+    window.detectorThread.setPreviewFps(args.preview_fps)
+    if args.target_fps or args.target_cpu:
+        window.detectorThread.setTarget(args.target_fps or 0, args.target_cpu or 0)
     window.show()
     app.exec()
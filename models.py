@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from logger import logger
+
+import cv2
+
+# Labels of the age and gender net outputs, in output order
+ageList = ['(0-2)', '(4-6)', '(8-12)', '(13-17)', '(18-24)',
+           '(25-32)', '(38-43)', '(48-53)', '(60-100)']
+genderList = ['Male', 'Female']
+
+MODEL_SPECS = {
+    "face": ("weights/opencv_face_detector_uint8.pb",
+             "weights/opencv_face_detector.pbtxt", (300, 300)),
+    "age": ("weights/age_net.caffemodel",
+            "weights/age_deploy.prototxt", (227, 227)),
+    "gender": ("weights/gender_net.caffemodel",
+               "weights/gender_deploy.prototxt", (227, 227)),
+}
+
+
+class ModelManager:
+    """Loads the networks lazily, one instance per thread.
+
+    cv2.dnn nets are not safe to share between threads, so every thread (and
+    every process, as each one has its own manager) gets its own copy. A net is
+    loaded on first use and warmed up with a dummy forward pass. When a weight
+    file changes on disk the next `get` call loads the new one. A thread which
+    ends hands its nets over with `release`, the next thread without nets
+    takes them instead of loading its own.
+    """
+
+    def __init__(self, specs: dict = MODEL_SPECS, checkInterval: float = 5.0) -> None:
+        self.specs = dict(specs)
+        self.checkInterval = checkInterval
+        self.timings: dict[str, dict] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._spare: list[tuple[int, dict]] = []
+        self._mtimes: dict[str, float] = {}
+        self._lastCheck = 0.0
+        self.backend = cv2.dnn.DNN_BACKEND_DEFAULT
+        self.target = cv2.dnn.DNN_TARGET_CPU
+        self.sizes = {name: spec[2] for name, spec in self.specs.items()}
+
+    def _modifiedTime(self, name: str) -> float:
+        model, config, _ = self.specs[name]
+        return max(os.path.getmtime(path) for path in (model, config))
+
+    def _checkFiles(self) -> None:
+        now = time.monotonic()
+        if now - self._lastCheck < self.checkInterval:
+            return
+        with self._lock:
+            self._lastCheck = now
+            for name in self._mtimes:
+                try:
+                    mtime = self._modifiedTime(name)
+                except OSError:
+                    continue
+                if mtime != self._mtimes[name]:
+                    logger.info(f"Weights of '{name}' changed on disk, reloading")
+                    self._mtimes[name] = mtime
+                    self._generation += 1
+
+    def load(self, name: str):
+        model, config, _ = self.specs[name]
+        size = self.sizes[name]
+        for path in (model, config):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Weight file of '{name}' net is missing: {path}")
+
+        started = time.perf_counter()
+        net = cv2.dnn.readNet(model, config)
+        net.setPreferableBackend(self.backend)
+        net.setPreferableTarget(self.target)
+        loaded = time.perf_counter()
+        net.setInput(np.zeros((1, 3, size[1], size[0]), dtype=np.float32))
+        net.forward()
+        warmed = time.perf_counter()
+
+        with self._lock:
+            self._mtimes[name] = self._modifiedTime(name)
+            timing = self.timings.setdefault(name, {"instances": 0})
+            timing["loadMs"] = round((loaded - started) * 1000, 1)
+            timing["warmupMs"] = round((warmed - loaded) * 1000, 1)
+            timing["instances"] += 1
+        logger.info(
+            f"Net '{name}' loaded in {timing['loadMs']} ms, "
+            f"warmed up in {timing['warmupMs']} ms ({threading.current_thread().name})")
+        return net
+
+    def get(self, name: str):
+        self._checkFiles()
+        nets = getattr(self._local, "nets", None)
+        if nets is None or self._local.generation != self._generation:
+            nets = self._local.nets = self._takeSpare()
+            self._local.generation = self._generation
+        if name not in nets:
+            nets[name] = self.load(name)
+        return nets[name]
+
+    def _takeSpare(self) -> dict:
+        with self._lock:
+            while self._spare:
+                generation, nets = self._spare.pop()
+                if generation == self._generation:
+                    return nets
+        return {}
+
+    def release(self) -> None:
+        """Hands the nets of the calling thread to the next one which needs them."""
+        nets = getattr(self._local, "nets", None)
+        if nets:
+            with self._lock:
+                self._spare.append((self._local.generation, nets))
+        self._local.nets = None
+
+    def preload(self, *names: str) -> None:
+        for name in names or self.specs:
+            self.get(name)
+
+    def configure(self, backend: int, target: int, sizes: dict) -> None:
+        with self._lock:
+            self.backend = backend
+            self.target = target
+            self.sizes.update(sizes)
+            self._generation += 1
+
+    def reload(self) -> None:
+        with self._lock:
+            self._generation += 1
+        logger.info("All nets will be reloaded on next use")
+
+
+models = ModelManager()
@@ -0,0 +1,58 @@
+import time
+
+import cv2
+
+
+class MotionGate:
+    """Cheap frame difference gate in front of the face detector.
+
+    Frames are compared on a small blurred grayscale copy against a running
+    background. `check` returns True when enough pixels changed or when the
+    keep-alive interval has passed since the last frame that was let through.
+    """
+
+    def __init__(self, threshold: float = 0.002, keepAlive: float = 2.0,
+                 width: int = 160) -> None:
+        self.threshold = threshold
+        self.keepAlive = keepAlive
+        self.width = width
+        self.frames = 0
+        self.skipped = 0
+        self.motion = 0.0
+        self._background = None
+        self._lastPass = 0.0
+
+    def reset(self) -> None:
+        self._background = None
+        self._lastPass = 0.0
+
+    def check(self, frame) -> bool:
+        self.frames += 1
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, h * self.width // w)),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        now = time.perf_counter()
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype("float32")
+            self._lastPass = now
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        _, mask = cv2.threshold(diff, 25, 255, cv2.THRESH_BINARY)
+        self.motion = cv2.countNonZero(mask) / mask.size
+        cv2.accumulateWeighted(gray, self._background, 0.5)
+
+        if self.motion >= self.threshold or now - self._lastPass >= self.keepAlive:
+            self._lastPass = now
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "gateFrames": self.frames,
+            "gateSkipped": self.skipped,
+            "motion": round(self.motion * 100, 2),
+        }
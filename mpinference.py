@@ -0,0 +1,236 @@
+import multiprocessing as mp
+import queue
+import sys
+import time
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from logger import logger
+
+
+def attachBlock(name: str) -> SharedMemory:
+    # The pool owns and unlinks the block, a worker attaching to it must not
+    # register it with the resource tracker or it is reported as leaked
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def workerMain(workerId: int, tasks, results, profile: dict | None = None) -> None:
+    import inference
+    from inference import detectFaces, predictFaces, setProfile
+    from models import models
+
+    if profile is not None:
+        # The profile of the main process, not the one saved in the config
+        setProfile(profile)
+    blocks: dict[int, SharedMemory] = {}
+    frame = None
+    try:
+        models.preload()
+        results.put(("ready", workerId, None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            taskId, slot, shmName, shape, dtype, detect, rois, boxes, detectSize = task
+            shm = blocks.get(slot)
+            if shm is None or shm.name != shmName:
+                # The pool has grown the block of this slot for a larger frame
+                if shm is not None:
+                    shm.close()
+                shm = blocks[slot] = attachBlock(shmName)
+            if detectSize is not None:
+                # The governor scales the detector input of the main process
+                inference.profile["detectSize"] = detectSize
+            # A view on the shared buffer, the frame is never pickled
+            frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            try:
+                # Detection only returns boxes, the caller decides which
+                # tracks still need the classifiers
+                if detect:
+                    records = [(box, None) for box in
+                               detectFaces(models.get("face"), frame, rois)]
+                else:
+                    records = [
+                        (box, None if pred is None else (pred[0].tolist(), pred[1].tolist()))
+                        for box, pred in zip(boxes, predictFaces(frame, boxes))
+                    ]
+            except Exception as e:
+                # A frame the nets cannot handle fails alone, not the worker
+                logger.error(f"Inference task {taskId} failed: {e}")
+                records = None
+            frame = None
+            results.put(("done", workerId, (taskId, records)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        frame = None
+        for shm in blocks.values():
+            shm.close()
+
+
+class Worker:
+    def __init__(self, process, tasks) -> None:
+        self.process = process
+        self.tasks = tasks
+        self.inflight: dict[int, tuple] = {}
+        self.ready = False
+
+
+class InferencePool:
+    """Runs detection and classification on a pool of worker processes.
+
+    Frames are copied once into slots of shared memory, workers read them in
+    place and send back only boxes and class probabilities. A task either
+    detects faces (`detect=True`) or classifies the given boxes. Dead workers
+    are restarted and their tasks are retried once.
+
+    Every slot has its own block, sized for the largest frame seen so far (or
+    `slotBytes`). A free slot whose block is too small is reallocated, so
+    cameras of different resolutions can share the pool. Workers apply
+    `profile` and follow its current detectSize with every task.
+    """
+
+    def __init__(self, processes: int, slots: int | None = None,
+                 slotBytes: int = 0, profile: dict | None = None) -> None:
+        self._context = mp.get_context("spawn")
+        self.processes = processes
+        self.profile = profile
+        self.slotBytes = slotBytes
+        self.slotCount = slots or processes * 2
+        self.blocks: list[SharedMemory | None] = [None] * self.slotCount
+        self.results = self._context.Queue()
+        self.freeSlots = list(range(self.slotCount))
+        self.dropped = 0
+        self.restarts = 0
+        self._nextTaskId = 0
+        self._retried: set[int] = set()
+        self._closing = False
+        self.workers = [self._startWorker(i) for i in range(processes)]
+        if slotBytes:
+            for slot in range(self.slotCount):
+                self._allocate(slot)
+        logger.info(f"Inference pool started with {processes} processes")
+
+    def _allocate(self, slot: int) -> None:
+        block = self.blocks[slot]
+        if block is not None:
+            block.close()
+            block.unlink()
+        self.blocks[slot] = SharedMemory(create=True, size=self.slotBytes)
+        logger.info(f"Inference slot {slot} uses {self.slotBytes / 2**20:.1f} MB")
+
+    def _startWorker(self, workerId: int) -> Worker:
+        tasks = self._context.Queue()
+        profile = None if self.profile is None else dict(self.profile)
+        process = self._context.Process(
+            target=workerMain, name=f"inference-{workerId}", daemon=True,
+            args=(workerId, tasks, self.results, profile))
+        process.start()
+        return Worker(process, tasks)
+
+    def _dispatch(self, task: tuple) -> None:
+        worker = min((w for w in self.workers if w.process.is_alive()),
+                     key=lambda w: len(w.inflight), default=self.workers[0])
+        worker.inflight[task[0]] = task
+        worker.tasks.put(task)
+
+    def submit(self, frame, detect: bool = True, rois=None, boxes=None) -> int | None:
+        if not self.freeSlots:
+            self.dropped += 1
+            return None
+
+        self.slotBytes = max(self.slotBytes, frame.nbytes)
+        # A slot which already fits the frame saves a reallocation
+        slot = next((s for s in self.freeSlots
+                     if self.blocks[s] is not None and self.blocks[s].size >= frame.nbytes),
+                    self.freeSlots[-1])
+        self.freeSlots.remove(slot)
+        if self.blocks[slot] is None or self.blocks[slot].size < frame.nbytes:
+            self._allocate(slot)
+        block = self.blocks[slot]
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=block.buf)
+        np.copyto(view, frame)
+        del view
+
+        taskId = self._nextTaskId
+        self._nextTaskId += 1
+        detectSize = None if self.profile is None else list(self.profile["detectSize"])
+        self._dispatch((taskId, slot, block.name, frame.shape, frame.dtype.str,
+                        detect, rois, list(boxes or []), detectSize))
+        return taskId
+
+    def checkWorkers(self) -> list[tuple]:
+        failed = []
+        for i, worker in enumerate(self.workers):
+            if self._closing or worker.process.is_alive():
+                continue
+            if not worker.ready:
+                # Crashing while loading the nets would only repeat itself
+                raise RuntimeError(
+                    f"Inference worker {i} failed to start (exit code {worker.process.exitcode})")
+            logger.error(
+                f"Inference worker {i} died with exit code {worker.process.exitcode}, restarting")
+            self.restarts += 1
+            self.workers[i] = self._startWorker(i)
+            for task in worker.inflight.values():
+                if task[0] in self._retried:
+                    self.freeSlots.append(task[1])
+                    failed.append((task[0], None))
+                else:
+                    self._retried.add(task[0])
+                    self._dispatch(task)
+        return failed
+
+    def poll(self, timeout: float = 0) -> list[tuple]:
+        """Returns finished `(taskId, records)`, records is None on failure."""
+        finished = self.checkWorkers()
+        wait = timeout > 0 and not finished
+        while True:
+            try:
+                if wait:
+                    kind, workerId, payload = self.results.get(timeout=timeout)
+                else:
+                    kind, workerId, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+            wait = False
+            if kind == "ready":
+                self.workers[workerId].ready = True
+                continue
+            taskId, records = payload
+            task = self.workers[workerId].inflight.pop(taskId, None)
+            if task is None:
+                continue
+            self._retried.discard(taskId)
+            self.freeSlots.append(task[1])
+            finished.append((taskId, records))
+        return finished
+
+    def inflight(self) -> int:
+        return sum(len(w.inflight) for w in self.workers)
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._closing = True
+        for worker in self.workers:
+            worker.tasks.put(None)
+        deadline = time.perf_counter() + timeout
+        for worker in self.workers:
+            worker.process.join(max(0.0, deadline - time.perf_counter()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        for block in self.blocks:
+            if block is not None:
+                block.close()
+                block.unlink()
+        logger.info("Inference pool closed")
@@ -0,0 +1,366 @@
+from PyQt6.QtCore import pyqtSlot
+from logger import logger
+from cameras import capturePool
+from pipeline import BoundedSlot, DropOldestQueue, LatencyMeter, ReadBackoff, Stage, frameSlot
+from utils import FaceDetector, CameraChannel
+import inference
+from inference import timedFaceBoxes, cropFace, predictCrops, regionCrops, tileRegions, mergeRegionBoxes
+from models import models
+from mpinference import InferencePool
+
+import time
+
+
+class InferenceService:
+    """Shared inference for several cameras.
+
+    Every round takes at most one (the newest) frame from each camera, starting
+    from a rotating offset, runs the detector on every region of the due frames
+    and the classifiers once for all pending faces. Faces are picked round-robin across
+    cameras up to `maxBatchFaces`, so a crowded camera cannot starve a quiet one.
+    """
+
+    def __init__(self, channels: list[CameraChannel], maxBatchFaces: int = 32) -> None:
+        self.channels = channels
+        self.maxBatchFaces = maxBatchFaces
+        self._offset = 0
+
+    def collect(self) -> list[tuple]:
+        n = len(self.channels)
+        frames = []
+        for k in range(n):
+            channel = self.channels[(self._offset + k) % n]
+            item = channel.slot.get(0)
+            if item is not None:
+                frames.append((channel, *item))
+        self._offset = (self._offset + 1) % max(1, n)
+        return frames
+
+    def locate(self, frames: list[tuple]) -> list[list]:
+        moving = [channel.hasMotion(frame) for channel, _, frame in frames]
+        due = [i for i, (channel, _, _) in enumerate(frames)
+               if moving[i] and channel.detectionDue()]
+        # Regions of interest of every due frame are detected together, one
+        # forward pass each as the face net does not take batches
+        regions = {i: tileRegions(regionCrops(frames[i][2], frames[i][0].config["rois"]))
+                   for i in due}
+        crops = [crop for i in due for crop, _, _ in regions[i]]
+        regionBoxes = timedFaceBoxes(models.get("face"), crops) if crops else []
+        detected, start = {}, 0
+        for i in due:
+            count = len(regions[i])
+            detected[i] = mergeRegionBoxes(
+                regions[i], regionBoxes[start:start + count])
+            start += count
+
+        tracksList = []
+        for i, (channel, _, _) in enumerate(frames):
+            if not moving[i]:
+                tracksList.append(channel.tracker.current())
+            elif i in detected:
+                tracksList.append(channel.tracker.update(detected[i]))
+            else:
+                tracksList.append(channel.tracker.predict())
+        return tracksList
+
+    def classify(self, frames: list[tuple], tracksList: list[list]) -> None:
+        queues = [
+            [(frame, track) for track in channel.pendingTracks(tracks)]
+            for (channel, _, frame), tracks in zip(frames, tracksList)
+        ]
+        batch = []
+        while len(batch) < self.maxBatchFaces and any(queues):
+            for queue in queues:
+                if queue and len(batch) < self.maxBatchFaces:
+                    batch.append(queue.pop(0))
+
+        faces, tracks = [], []
+        for frame, track in batch:
+            face = cropFace(frame, track.bbox)
+            if face.size > 0:
+                faces.append(face)
+                tracks.append(track)
+        if not faces:
+            return
+        agePreds, genderPreds = predictCrops(faces)
+        for track, agePred, genderPred in zip(tracks, agePreds, genderPreds):
+            track.vote(agePred, genderPred)
+
+    def idle(self) -> bool:
+        return all(channel.slot.empty() for channel in self.channels)
+
+    def step(self) -> list[tuple]:
+        frames = self.collect()
+        if not frames:
+            return []
+        tracksList = self.locate(frames)
+        self.classify(frames, tracksList)
+        return [
+            (channel, capturedAt, frame, *channel.results(tracks))
+            for (channel, capturedAt, frame), tracks in zip(frames, tracksList)
+        ]
+
+
+class ProcessInferenceService(InferenceService):
+    """Variant of InferenceService which runs the nets on an InferencePool.
+
+    Every camera has at most one frame in flight, which keeps its results in
+    order and shares the worker processes fairly. Tracking, motion gating and
+    voting stay in this process, only boxes and probabilities come back.
+    """
+
+    def __init__(self, channels: list[CameraChannel], pool: InferencePool) -> None:
+        super().__init__(channels)
+        self.pool = pool
+        self.pending: dict[int, tuple] = {}
+        self.busy: set[int] = set()
+
+    def collect(self) -> list[tuple]:
+        n = len(self.channels)
+        frames = []
+        for k in range(n):
+            channel = self.channels[(self._offset + k) % n]
+            if channel.cameraIndex in self.busy:
+                continue
+            item = channel.slot.get(0)
+            if item is not None:
+                frames.append((channel, *item))
+        self._offset = (self._offset + 1) % max(1, n)
+        return frames
+
+    def submit(self, channel: CameraChannel, capturedAt: float, frame) -> tuple | None:
+        # Returns a finished result when nothing had to be sent to a worker
+        if not channel.hasMotion(frame):
+            return (channel, capturedAt, frame,
+                    *channel.results(channel.tracker.current()))
+
+        tracks, pending = None, None
+        if channel.detectionDue():
+            taskId = self.pool.submit(frame, detect=True, rois=channel.config["rois"])
+        else:
+            tracks = channel.tracker.predict()
+            pending = channel.pendingTracks(tracks)
+            if not pending:
+                return (channel, capturedAt, frame, *channel.results(tracks))
+            taskId = self.pool.submit(
+                frame, detect=False, boxes=[track.bbox for track in pending])
+
+        if taskId is None:
+            # All frame slots are in use, keep tracking without the nets
+            tracks = tracks if tracks is not None else channel.tracker.predict()
+            return (channel, capturedAt, frame, *channel.results(tracks))
+        self.pending[taskId] = (channel, capturedAt, frame, tracks, pending)
+        self.busy.add(channel.cameraIndex)
+        return None
+
+    def finish(self, taskId: int, records: list | None) -> tuple | None:
+        # Returns None while the frame went on to a classification task
+        channel, capturedAt, frame, tracks, pending = self.pending.pop(taskId)
+        self.busy.discard(channel.cameraIndex)
+        if records is None:
+            tracks = tracks if tracks is not None else channel.tracker.current()
+        elif tracks is None:
+            tracks = channel.tracker.update([box for box, _ in records])
+            pending = channel.pendingTracks(tracks)
+            if pending:
+                taskId = self.pool.submit(
+                    frame, detect=False, boxes=[track.bbox for track in pending])
+                if taskId is not None:
+                    self.pending[taskId] = (channel, capturedAt, frame, tracks, pending)
+                    self.busy.add(channel.cameraIndex)
+                    return None
+        else:
+            for track, (_, pred) in zip(pending, records):
+                if pred is not None:
+                    track.vote(*pred)
+        return (channel, capturedAt, frame, *channel.results(tracks))
+
+    def idle(self) -> bool:
+        return not self.pending and super().idle()
+
+    def step(self) -> list[tuple]:
+        results = []
+        for frame in self.collect():
+            result = self.submit(*frame)
+            if result is not None:
+                results.append(result)
+        for taskId, records in self.pool.poll(0.01 if self.pending else 0):
+            result = self.finish(taskId, records)
+            if result is not None:
+                results.append(result)
+        return results
+
+
+class MultiCameraDetector(FaceDetector):
+    """Runs several cameras at once with one capture worker per device.
+
+    `cameraIndex` selects which camera is previewed, `result` carries the latest
+    faces of every camera, each tagged with its own camera index.
+    """
+
+    def __init__(self, cameraIndexes: list[int], parent=None, processes: int = 0) -> None:
+        super().__init__(parent)
+        self.processes = processes
+        self.cameraIndexes = list(cameraIndexes)
+        self.cameraIndex = self.cameraIndexes[0]
+        self.channels: list[CameraChannel] = []
+
+    def pipelineStats(self) -> dict:
+        stages = getattr(self, "_stages", None)
+        if stages is None:
+            return {}
+        _, rendered, latency = stages
+        return {
+            "captured": sum(c.slot.total for c in self.channels),
+            "captureDropped": sum(c.slot.dropped for c in self.channels),
+            "rendered": rendered.total,
+            "renderDropped": rendered.dropped,
+            "latencyMs": round(latency.value, 1),
+            "maxLatencyMs": round(latency.max, 1),
+            "previews": self.preview.published,
+            "previewsCoalesced": self.preview.coalesced,
+            "gateFrames": sum(c.gate.frames for c in self.channels),
+            "gateSkipped": sum(c.gate.skipped for c in self.channels),
+            "motion": max((c.gate.motion * 100 for c in self.channels), default=0),
+            "governor": self.governor.operatingPoint(),
+        }
+
+    @pyqtSlot()
+    def run(self) -> None:
+        self._runId += 1
+        runId = self._runId
+        self._stopping = False
+        self.status.emit(
+            f"CAM {', '.join(str(i) for i in self.cameraIndexes)} Starting")
+        try:
+            self.channels = [CameraChannel(i) for i in self.cameraIndexes]
+            caps = {}
+            for channel in self.channels:
+                caps[channel.cameraIndex], _ = capturePool.acquire(channel.cameraIndex)
+                channel.slot = frameSlot(caps[channel.cameraIndex])
+            self.governor.apply(self.channels)
+            if self.processes > 0:
+                pool = InferencePool(self.processes, profile=inference.profile)
+                service = ProcessInferenceService(self.channels, pool)
+            else:
+                pool = None
+                service = InferenceService(self.channels)
+            # Without live input nothing has to be dropped, every frame is
+            # rendered in order
+            live = any(not isinstance(c.slot, BoundedSlot) for c in self.channels)
+            rendered = DropOldestQueue(self.renderQueueSize * len(self.channels)) \
+                if live else BoundedSlot(self.renderQueueSize * len(self.channels))
+            latency = LatencyMeter()
+            self._stages = (None, rendered, latency)
+
+            def alive() -> bool:
+                return self.canDetect and not self._stopping and runId == self._runId
+
+            backoffs = {channel.cameraIndex: ReadBackoff() for channel in self.channels}
+
+            def captureStep(channel: CameraChannel):
+                cap = caps[channel.cameraIndex]
+                if not alive() or not cap.isOpened():
+                    return False
+                ok, frame = cap.read()
+                backoff = backoffs[channel.cameraIndex]
+                if ok:
+                    backoff.ok()
+                    channel.slot.put((time.perf_counter(), frame))
+                elif not backoff.failed():
+                    logger.error(f"CAM {channel.cameraIndex} delivers no frames, giving up")
+                    return False
+
+            def inferenceStep():
+                if not alive():
+                    return False
+                started = time.perf_counter()
+                results = service.step()
+                if not results:
+                    if all(stage.stopped() for stage in stages) and service.idle():
+                        # Every source has ended and its last frame is done
+                        return False
+                    time.sleep(0.005)
+                    return
+                elapsed = time.perf_counter() - started
+                self.governor.update(elapsed, self.channels, len(results))
+                self.governor.pace(elapsed, len(results))
+                for item in results:
+                    rendered.put(item)
+
+            stages = [
+                Stage(f"capture-{channel.cameraIndex}",
+                      lambda channel=channel: captureStep(channel))
+                for channel in self.channels
+            ]
+            # Without a pool the nets stay loaded for the next run
+            setup, teardown = (models.preload, models.release) if pool is None else (None, None)
+            inferenceStage = Stage("inference", inferenceStep, setup, teardown)
+            for stage in stages:
+                stage.start()
+            inferenceStage.start()
+
+            self.status.emit("Capturing")
+            captureStages = {c.cameraIndex: stage for c, stage in zip(self.channels, stages)}
+            # Latest (renderedAt, rows) and render period of every camera
+            latest: dict[int, tuple] = {}
+            periods: dict[int, float] = {}
+            lastStats = time.perf_counter()
+            try:
+                while alive():
+                    item = rendered.get(0.1)
+                    if item is None:
+                        if inferenceStage.stopped():
+                            break
+                        continue
+                    channel, capturedAt, frame, bboxes, labels, data = item
+                    now = time.perf_counter()
+                    previous = latest.get(channel.cameraIndex)
+                    if previous is not None:
+                        period = now - previous[0]
+                        periods[channel.cameraIndex] = 0.8 * periods.get(
+                            channel.cameraIndex, period) + 0.2 * period
+                    latest[channel.cameraIndex] = (now, data)
+                    # Faces of a camera whose source ended or stalled are not
+                    # current anymore and must not be saved again
+                    for cam, (renderedAt, _) in list(latest.items()):
+                        if cam != channel.cameraIndex and (
+                                captureStages[cam].stopped()
+                                or now - renderedAt > 2 * periods.get(cam, 0.5)):
+                            del latest[cam]
+                    self.result.emit(
+                        [row for _, rows in latest.values() for row in rows])
+                    if channel.cameraIndex == self.cameraIndex and self.previewDue():
+                        if self.canDraw:
+                            self.drawOverlays(frame, bboxes, labels)
+                        self.emitFrame(frame)
+                    latency.add(capturedAt)
+
+                    if time.perf_counter() - lastStats >= self.statsInterval:
+                        lastStats = time.perf_counter()
+                        self.stats.emit(self.pipelineStats())
+            finally:
+                for stage in stages + [inferenceStage]:
+                    stage.stop()
+                for slot in [c.slot for c in self.channels] + [rendered]:
+                    if isinstance(slot, BoundedSlot):
+                        slot.close()
+                for stage in stages + [inferenceStage]:
+                    stage.join(2)
+                for stage, (cameraIndex, cap) in zip(stages, caps.items()):
+                    if stage.is_alive():
+                        cap.release()
+                    else:
+                        capturePool.release(cameraIndex, cap)
+                if pool is not None:
+                    pool.close()
+            if inferenceStage.error is not None:
+                raise inferenceStage.error
+        except Exception as e:
+            self.status.emit(str(e))
+            logger.error(str(e))
+
+    def setCameraIndex(self, a0: int):
+        # All cameras keep running, only the preview is switched
+        self.cameraIndex = a0
+        logger.info(f"Preview changed to CAM {a0}")
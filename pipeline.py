@@ -0,0 +1,250 @@
+import queue
+import threading
+import time
+
+
+class LatestSlot:
+    """Single item holder that always keeps only the newest item.
+
+    Putting into a full slot replaces the old item and counts it as dropped,
+    so a slow consumer never works on stale frames.
+    """
+
+    def __init__(self) -> None:
+        self._item = None
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.total = 0
+
+    def put(self, item) -> None:
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self.total += 1
+            self._cond.notify()
+
+    def get(self, timeout: float | None = None):
+        with self._cond:
+            if self._item is None:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def clear(self) -> None:
+        with self._cond:
+            self._item = None
+
+    def empty(self) -> bool:
+        with self._cond:
+            return self._item is None
+
+
+class BoundedSlot:
+    """Blocking counterpart of LatestSlot for sources that can wait.
+
+    Replayed files and synthetic frames read faster than real time are held
+    back until the consumer is ready instead of being dropped. `close` wakes
+    a producer blocked in `put`.
+    """
+
+    def __init__(self, maxsize: int = 2) -> None:
+        self._queue = queue.Queue(maxsize)
+        self._closed = threading.Event()
+        self.dropped = 0
+        self.total = 0
+
+    def put(self, item) -> None:
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                self.total += 1
+                return
+            except queue.Full:
+                pass
+
+    def get(self, timeout: float | None = None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self) -> None:
+        while not self.empty():
+            self.get(0)
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+def frameSlot(cap):
+    # Live cameras keep only the newest frame, other sources get backpressure
+    return LatestSlot() if getattr(cap, "realtime", True) else BoundedSlot()
+
+
+class DropOldestQueue:
+    """Bounded queue which evicts the oldest item instead of blocking."""
+
+    def __init__(self, maxsize: int = 2) -> None:
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.total = 0
+
+    def put(self, item) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+            self.total += 1
+
+    def get(self, timeout: float | None = None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def empty(self) -> bool:
+        return self._queue.empty()
+
+
+class Stage(threading.Thread):
+    """Worker thread that calls `step` until stopped.
+
+    `setup` runs once inside the thread first, e.g. to load thread-local nets,
+    and `teardown` last, e.g. to hand them on.
+    """
+
+    def __init__(self, name: str, step, setup=None, teardown=None) -> None:
+        super().__init__(name=name, daemon=True)
+        self._step = step
+        self._setup = setup
+        self._teardown = teardown
+        self._stopEvent = threading.Event()
+        self.error: Exception | None = None
+
+    def run(self) -> None:
+        try:
+            if self._setup is not None:
+                self._setup()
+            while not self._stopEvent.is_set():
+                if self._step() is False:
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self._stopEvent.set()
+            if self._teardown is not None:
+                self._teardown()
+
+    def stop(self) -> None:
+        self._stopEvent.set()
+
+    def stopped(self) -> bool:
+        return self._stopEvent.is_set()
+
+
+class ReadBackoff:
+    """Waits longer after every failed read of a capture that is still open.
+
+    `failed()` sleeps up to `maxDelay` seconds and returns False once reads
+    have failed for `giveUpSeconds` in a row, `ok()` starts over.
+    """
+
+    def __init__(self, maxDelay: float = 0.5, giveUpSeconds: float = 10.0) -> None:
+        self.maxDelay = maxDelay
+        self.giveUpSeconds = giveUpSeconds
+        self.failures = 0
+        self._since = 0.0
+
+    def ok(self) -> None:
+        self.failures = 0
+
+    def failed(self) -> bool:
+        now = time.perf_counter()
+        if self.failures == 0:
+            self._since = now
+        self.failures += 1
+        if now - self._since >= self.giveUpSeconds:
+            return False
+        time.sleep(min(self.maxDelay, 0.005 * 2 ** min(self.failures, 10)))
+        return True
+
+
+class LatencyMeter:
+    """Keeps an exponential moving average of end-to-end latency in ms."""
+
+    def __init__(self, alpha: float = 0.1) -> None:
+        self.alpha = alpha
+        self.value = 0.0
+        self.max = 0.0
+
+    def add(self, startedAt: float) -> None:
+        latency = (time.perf_counter() - startedAt) * 1000
+        self.value = latency if self.value == 0 else \
+            self.alpha * latency + (1 - self.alpha) * self.value
+        self.max = max(self.max, latency)
+
+
+class PreviewRing:
+    """Small ring of reused preview buffers with single-pending coalescing.
+
+    The worker scales each preview into a free buffer, the consumer takes the
+    newest one. A buffer is never written while it is pending or being shown,
+    and a new preview simply replaces a pending one that was not taken yet.
+    """
+
+    def __init__(self, size: int = 3) -> None:
+        self._buffers = [None] * max(3, size)
+        self._lock = threading.Lock()
+        self._pending: int | None = None
+        self._shown: int | None = None
+        self.published = 0
+        self.coalesced = 0
+
+    def write(self, frame, size: tuple[int, int]) -> bool:
+        """Scales `frame` to `size` into a free buffer.
+
+        Returns True when the consumer has to be notified, i.e. when no other
+        preview was already waiting.
+        """
+        import cv2
+
+        with self._lock:
+            index = next(i for i in range(len(self._buffers))
+                         if i != self._pending and i != self._shown)
+        w, h = size
+        buffer = self._buffers[index]
+        if buffer is None or buffer.shape != (h, w, frame.shape[2]):
+            buffer = self._buffers[index] = cv2.resize(
+                frame, (w, h), interpolation=cv2.INTER_AREA)
+        else:
+            cv2.resize(frame, (w, h), dst=buffer, interpolation=cv2.INTER_AREA)
+
+        with self._lock:
+            notify = self._pending is None
+            if not notify:
+                self.coalesced += 1
+            self._pending = index
+            self.published += 1
+            return notify
+
+    def take(self):
+        with self._lock:
+            if self._pending is None:
+                return None
+            self._shown, self._pending = self._pending, None
+            return self._buffers[self._shown]
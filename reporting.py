@@ -45,7 +45,7 @@ class ReportWindow(QMainWindow):
 
         self.mainLayout.addLayout(self.chartLayout)
         self.container.setLayout(self.mainLayout)
-        if len(db.fetchAll()) != 0:
+        if hasData():
             self.addPdfView()
 
             # Add charts
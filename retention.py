@@ -0,0 +1,160 @@
+"""Moves old raw rows into compressed per-day archives.
+
+Usage:
+    python retention.py --days 30
+    python retention.py --enable-incremental-vacuum
+
+Rows older than `rawDays` are written to `archive/infos-YYYY-MM-DD.csv.gz`
+and deleted from `infos` one day per transaction. The minute and hour
+rollups are kept, so reports still cover archived days. Freed pages are
+returned with `PRAGMA incremental_vacuum` in small steps.
+"""
+import argparse
+import csv
+import gzip
+import os
+
+from datetime import date, datetime, time, timedelta
+
+from config import getRetentionConfig
+from db import DB
+from logger import logger
+
+COLUMNS = ["id", "cam", "age", "gender", "datetime"]
+
+
+def archivePath(archiveDir: str, day: date) -> str:
+    return os.path.join(archiveDir, f"infos-{day.isoformat()}.csv.gz")
+
+
+def readArchiveFile(path: str) -> list[tuple]:
+    with gzip.open(path, "rt", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return [(int(row[0]), *row[1:]) for row in reader]
+
+
+def writeArchiveFile(path: str, rows: list[tuple]) -> None:
+    # Written next to the target and renamed, a crash never leaves half a file
+    tmpPath = path + ".tmp"
+    with gzip.open(tmpPath, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+    os.replace(tmpPath, path)
+
+
+def archiveDay(db: DB, archiveDir: str, day: date) -> int:
+    start = datetime.combine(day, time())
+    end = start + timedelta(days=1)
+    # Holds the write lock, no row of the day can slip in between
+    db.cursor.execute("BEGIN IMMEDIATE")
+    rows = db.fetchStored(start, end)
+    if not rows:
+        db.conn.commit()
+        return 0
+
+    os.makedirs(archiveDir, exist_ok=True)
+    path = archivePath(archiveDir, day)
+    if os.path.exists(path):
+        # Left over from an interrupted run or rows ingested later
+        archived = readArchiveFile(path)
+        known = {row[0] for row in archived}
+        rows = sorted(archived + [row for row in rows if row[0] not in known])
+    else:
+        rows = sorted(rows)
+    writeArchiveFile(path, rows)
+
+    db.cursor.execute("DELETE FROM infos WHERE ts >= ? AND ts < ?",
+                      (int(start.timestamp()), int(end.timestamp())))
+    deleted = db.cursor.rowcount
+    db.conn.commit()
+    return deleted
+
+
+def applyRetention(db: DB, rawDays: int, archiveDir: str = "archive",
+                   maxDays: int = 7, vacuumPages: int = 1000) -> int:
+    """Archives up to `maxDays` of rows older than `rawDays` days."""
+    if rawDays <= 0:
+        return 0
+    cutoff = datetime.combine(date.today() - timedelta(days=rawDays), time())
+    days = [
+        date.fromisoformat(row[0]) for row in db.cursor.execute(
+            "SELECT DISTINCT date(ts, 'unixepoch', 'localtime') FROM infos "
+            "WHERE ts < ? ORDER BY 1 LIMIT ?", (int(cutoff.timestamp()), maxDays))
+    ]
+    archived = 0
+    for day in days:
+        count = archiveDay(db, archiveDir, day)
+        archived += count
+        logger.info(f"{count} rows of {day} archived")
+    if archived:
+        db.cursor.execute(f"PRAGMA incremental_vacuum({int(vacuumPages)})")
+        db.cursor.fetchall()
+    return archived
+
+
+def readArchive(archiveDir: str, start: datetime | None = None,
+                end: datetime | None = None) -> list[tuple]:
+    """Archived rows between start and end in the fetchAll format, newest first."""
+    if not os.path.isdir(archiveDir):
+        return []
+    rows = []
+    for name in os.listdir(archiveDir):
+        if not (name.startswith("infos-") and name.endswith(".csv.gz")):
+            continue
+        day = date.fromisoformat(name[6:16])
+        if (start and day < start.date()) or (end and day > end.date()):
+            continue
+        rows += readArchiveFile(os.path.join(archiveDir, name))
+
+    first = start.strftime("%Y-%m-%d %H:%M:%S") if start else ""
+    last = end.strftime("%Y-%m-%d %H:%M:%S") if end else "9999"
+    return sorted((row for row in rows if first <= row[4] < last), reverse=True)
+
+
+def clearArchive(archiveDir: str) -> int:
+    """Deletes every archive file, e.g. when the database is deleted."""
+    if not os.path.isdir(archiveDir):
+        return 0
+    names = [name for name in os.listdir(archiveDir)
+             if name.startswith("infos-") and name.endswith(".csv.gz")]
+    for name in names:
+        os.remove(os.path.join(archiveDir, name))
+    return len(names)
+
+
+def fetchWithArchive(db: DB, start: datetime | None = None,
+                     end: datetime | None = None) -> list[tuple]:
+    archived = readArchive(getRetentionConfig()["archiveDir"], start, end)
+    return db.fetchRange(start, end) + archived
+
+
+def enableIncrementalVacuum(db: DB) -> None:
+    # Changing auto_vacuum on an existing file needs one full VACUUM
+    db.cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    db.cursor.execute("VACUUM")
+    logger.info("Incremental vacuum enabled")
+
+
+if __name__ == "__main__":
+    config = getRetentionConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=config["rawDays"],
+                        help="keep raw rows of this many days")
+    parser.add_argument("--archive-dir", default=config["archiveDir"],
+                        help="folder of the archive files")
+    parser.add_argument("--max-days", type=int, default=10**6,
+                        help="days archived in this run")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert an existing database once, this runs a full VACUUM")
+    args = parser.parse_args()
+
+    db = DB()
+    db.connect()
+    if args.enable_incremental_vacuum:
+        enableIncrementalVacuum(db)
+    else:
+        count = applyRetention(db, args.days, args.archive_dir, args.max_days,
+                               config["vacuumPages"])
+        logger.info(f"{count} rows archived")
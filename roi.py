@@ -0,0 +1,43 @@
+"""Select detection regions of a camera and save them to config.json.
+
+Usage:
+    python roi.py --cam 0          # draw rectangles, ENTER/SPACE after each one, ESC to finish
+    python roi.py --cam 0 --clear  # use the whole frame again
+
+Polygons can be added by hand as lists of relative [x, y] points.
+"""
+import argparse
+
+import cv2
+
+from cameras import openCapture
+from config import setCameraConfig
+from logger import logger
+
+
+def selectRois(cameraIndex: int) -> list[list[float]]:
+    cap = openCapture(cameraIndex)
+    ok, frame = cap.read()
+    cap.release()
+    if not ok:
+        raise RuntimeError(f"CAM {cameraIndex} could not be read")
+
+    h, w = frame.shape[:2]
+    rects = cv2.selectROIs(f"CAM {cameraIndex} regions", frame, False)
+    cv2.destroyAllWindows()
+    return [
+        [round(x / w, 4), round(y / h, 4), round((x + rw) / w, 4), round((y + rh) / h, 4)]
+        for x, y, rw, rh in rects
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cam", type=int, default=0, help="camera index")
+    parser.add_argument("--clear", action="store_true",
+                        help="remove the regions of the camera")
+    args = parser.parse_args()
+
+    rois = [] if args.clear else selectRois(args.cam)
+    setCameraConfig(args.cam, rois=rois)
+    logger.info(f"CAM {args.cam} has {len(rois)} regions of interest")
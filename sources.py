@@ -0,0 +1,203 @@
+"""Frame sources which can stand in for a camera.
+
+A source is selected with a spec string wherever a camera index is accepted:
+
+    0                                          live device 0
+    file:recordings/entrance.mp4?loop=1        video file at real-time speed
+    file:snapshots/?fps=5&realtime=0           image folder as fast as possible
+    synthetic?faces=6&size=1280x720&seed=1     generated frames
+
+Every source has the `isOpened`/`read`/`release` interface of
+cv2.VideoCapture, so the detectors do not need to know which one they got.
+"""
+import os
+import time
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def parseSource(spec) -> tuple[str, str, dict]:
+    if isinstance(spec, int) or str(spec).isdigit():
+        return "device", str(spec), {}
+    head, _, query = str(spec).partition("?")
+    kind, _, target = head.partition(":")
+    options = dict(
+        part.split("=", 1) for part in query.split("&") if "=" in part)
+    return kind, target, options
+
+
+def sourceSpec(value: str):
+    """argparse type, plain numbers stay camera indexes."""
+    return int(value) if value.isdigit() else value
+
+
+def sourceSortKey(spec) -> tuple:
+    # Devices first by index, then file and synthetic sources by name
+    return (0, spec, "") if isinstance(spec, int) else (1, 0, str(spec))
+
+
+class FrameSource(ABC):
+    def __init__(self, fps: float, realtime: bool) -> None:
+        self.fps = fps
+        self.realtime = realtime
+        self._opened = True
+        self._started = None
+        self.frameNo = 0
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def release(self) -> None:
+        self._opened = False
+
+    @abstractmethod
+    def nextFrame(self):
+        """Returns the next frame or None when the source has ended."""
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        if self.realtime and self.fps > 0:
+            # Frames are handed out on the schedule a camera would keep
+            if self._started is None:
+                self._started = time.perf_counter()
+            delay = self._started + self.frameNo / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        frame = self.nextFrame()
+        if frame is None:
+            self._opened = False
+            return False, None
+        self.frameNo += 1
+        return True, frame
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path: str, realtime: bool = True, loop: bool = False) -> None:
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(self.cap.get(cv2.CAP_PROP_FPS) or 25.0, realtime)
+        self.loop = loop
+        self._opened = self.cap.isOpened()
+
+    def nextFrame(self):
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        return frame if ok else None
+
+    def release(self) -> None:
+        super().release()
+        self.cap.release()
+
+
+class ImageFolderSource(FrameSource):
+    def __init__(self, folder: str, fps: float = 10.0, realtime: bool = True,
+                 loop: bool = False) -> None:
+        super().__init__(fps, realtime)
+        self.files = sorted(
+            os.path.join(folder, f) for f in os.listdir(folder)
+            if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.loop = loop
+        self._index = 0
+        self._opened = bool(self.files)
+
+    def nextFrame(self):
+        if self._index >= len(self.files):
+            if not self.loop:
+                return None
+            self._index = 0
+        frame = cv2.imread(self.files[self._index])
+        self._index += 1
+        return frame
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic generated frames with a given number of moving faces.
+
+    Faces are pasted from the images of `faceFolder` when one is given,
+    otherwise simple drawn faces are used. With the same seed every run
+    produces the same frames.
+    """
+
+    def __init__(self, faces: int = 3, size: tuple[int, int] = (1280, 720),
+                 fps: float = 30.0, realtime: bool = True, seed: int = 0,
+                 faceFolder: str | None = None, frames: int = 0) -> None:
+        super().__init__(fps, realtime)
+        self.width, self.height = size
+        self.frames = frames
+        rng = np.random.default_rng(seed)
+        self.background = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.background[:] = rng.integers(60, 120, size=3, dtype=np.uint8)
+        side = max(40, min(self.width, self.height) // 6)
+        self.side = side
+        self.positions = rng.uniform(
+            (0, 0), (self.width - side, self.height - side), size=(faces, 2))
+        self.velocities = rng.uniform(-4, 4, size=(faces, 2))
+        self.sprites = self.loadSprites(faceFolder, faces, rng)
+
+    def loadSprites(self, folder: str | None, count: int, rng) -> list:
+        side = self.side
+        sprites = []
+        if folder:
+            files = sorted(
+                os.path.join(folder, f) for f in os.listdir(folder)
+                if f.lower().endswith(IMAGE_EXTENSIONS))
+            for i in range(count):
+                image = cv2.imread(files[i % len(files)]) if files else None
+                if image is not None:
+                    sprites.append(cv2.resize(image, (side, side)))
+        while len(sprites) < count:
+            sprite = np.zeros((side, side, 3), dtype=np.uint8)
+            sprite[:] = self.background[0, 0]
+            skin = tuple(int(v) for v in rng.integers(120, 220, size=3))
+            c = side // 2
+            cv2.ellipse(sprite, (c, c), (side * 2 // 5, side // 2 - 2), 0, 0, 360, skin, -1)
+            for x in (c - side // 6, c + side // 6):
+                cv2.circle(sprite, (x, c - side // 10), max(2, side // 16), (40, 40, 40), -1)
+            cv2.ellipse(sprite, (c, c + side // 5), (side // 6, side // 14),
+                        0, 0, 180, (60, 60, 160), -1)
+            sprites.append(sprite)
+        return sprites
+
+    def nextFrame(self):
+        if self.frames and self.frameNo >= self.frames:
+            return None
+        frame = self.background.copy()
+        limits = np.array([self.width - self.side, self.height - self.side])
+        for i, sprite in enumerate(self.sprites):
+            position = self.positions[i] + self.velocities[i]
+            bounced = (position < 0) | (position > limits)
+            self.velocities[i][bounced] *= -1
+            self.positions[i] = np.clip(position, 0, limits)
+            x, y = self.positions[i].astype(int)
+            frame[y:y + self.side, x:x + self.side] = sprite
+        return frame
+
+
+def openSource(spec):
+    kind, target, options = parseSource(spec)
+    realtime = options.get("realtime", "1") != "0"
+    loop = options.get("loop", "0") == "1"
+    if kind == "file":
+        if os.path.isdir(target):
+            return ImageFolderSource(target, float(options.get("fps", 10)), realtime, loop)
+        return VideoFileSource(target, realtime, loop)
+    if kind == "synthetic":
+        width, _, height = options.get("size", "1280x720").partition("x")
+        return SyntheticSource(
+            faces=int(options.get("faces", 3)),
+            size=(int(width), int(height)),
+            fps=float(options.get("fps", 30)),
+            realtime=realtime,
+            seed=int(options.get("seed", 0)),
+            faceFolder=options.get("faces_from"),
+            frames=int(options.get("frames", 0)),
+        )
+    raise ValueError(f"Unknown frame source: {spec}")
@@ -0,0 +1,88 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from db import connections
+
+
+class DetectionTableModel(QAbstractTableModel):
+    """Saved detections, newest first, paged lazily from the database.
+
+    The view pulls older pages through `canFetchMore`/`fetchMore` while it
+    scrolls, `refresh` only adds rows with an id above the newest one seen.
+    Rows still in the event log show up once they are compacted.
+    """
+
+    # Header and index into the (id, cam, age, gender, datetime) rows
+    COLUMNS = (("#", 0), ("Age", 2), ("Gender", 3), ("Datetime", 4), ("Cam", 1))
+
+    def __init__(self, parent=None, pageSize: int = 500) -> None:
+        super().__init__(parent)
+        self.pageSize = pageSize
+        self.rows: list[tuple] = []
+        self.newestId = 0
+        self.oldestId: int | None = None
+        self.exhausted = False
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return str(self.rows[index.row()][self.COLUMNS[index.column()][1]])
+
+    def headerData(self, section: int, orientation: Qt.Orientation,
+                   role: int = Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section][0]
+        return str(section + 1)
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if parent.isValid():
+            return
+        with connections.reader() as db:
+            rows = db.fetchPage(self.oldestId, self.pageSize)
+        self.exhausted = len(rows) < self.pageSize
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+        self.rows += rows
+        self.endInsertRows()
+        self.oldestId = rows[-1][0]
+        self.newestId = max(self.newestId, rows[0][0])
+
+    def refresh(self) -> int:
+        with connections.reader() as db:
+            rows = db.fetchSince(self.newestId)
+        if rows:
+            self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+            self.rows[:0] = rows
+            self.endInsertRows()
+            self.newestId = rows[0][0]
+            if self.oldestId is None:
+                self.oldestId = rows[-1][0]
+        return len(rows)
+
+    def clear(self) -> None:
+        # Only the view is emptied, new rows keep arriving through refresh
+        self.beginResetModel()
+        self.rows = []
+        self.oldestId = self.newestId
+        self.exhausted = True
+        self.endResetModel()
+
+    def reset(self) -> None:
+        self.beginResetModel()
+        self.rows = []
+        self.newestId = 0
+        self.oldestId = None
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore()
@@ -0,0 +1,52 @@
+import sqlite3
+
+from db import DB, SCHEMA_VERSION, toEpoch
+
+LEGACY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "infos" (
+    "id" INTEGER NOT NULL,
+    "cam" TEXT,
+    "age" TEXT,
+    "gender" TEXT,
+    "datetime" TEXT,
+    PRIMARY KEY("id" AUTOINCREMENT)
+)"""
+
+LEGACY_ROWS = [
+    (3, "0", "(25-32)", "Male", "2024-03-10 09:15:42.123456"),
+    (7, "1", "(8-12)", "Female", "2024-03-10 09:15:58"),
+    (8, None, "(25-32)", None, "2024-03-10 10:02:01.5"),
+    (12, "0", None, "Male", "2024-03-11 23:59:59"),
+    (15, "0", "(25-32)", "Male", None),
+    (16, "1", "(8-12)", "Female", "not a date"),
+]
+
+
+def test_legacy_migration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy = sqlite3.connect("data.db")
+    legacy.execute(LEGACY_SCHEMA)
+    legacy.executemany("INSERT INTO infos VALUES(?, ?, ?, ?, ?)", LEGACY_ROWS)
+    legacy.commit()
+    legacy.close()
+
+    db = DB()
+    db.connect()
+    assert db.cursor.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    migrated = db.cursor.execute(
+        "SELECT i.id, c.label, a.label, g.label, i.ts FROM infos i "
+        "JOIN cameras c ON c.code = i.cam JOIN ages a ON a.code = i.age "
+        "JOIN genders g ON g.code = i.gender ORDER BY i.id").fetchall()
+    # Rows without a usable datetime are dropped, missing labels become 'unknown'
+    expected = [
+        (rowId, cam or "unknown", age or "unknown", gender or "unknown", toEpoch(dt[:19]))
+        for rowId, cam, age, gender, dt in LEGACY_ROWS[:4]]
+    assert migrated == expected
+    for name in ("minute", "hour"):
+        total = db.cursor.execute(f"SELECT SUM(count) FROM rollup_{name}").fetchone()[0]
+        assert total == len(expected)
+    assert db.countBy("genders", "gender") == {"Male": 2, "Female": 1, "unknown": 1}
+    # Built-in labels keep the model output order
+    ages = [label for _, label in db.cursor.execute("SELECT code, label FROM ages ORDER BY code")]
+    assert ages[:2] == ["(0-2)", "(4-6)"]
+    assert "unknown" in ages
@@ -0,0 +1,56 @@
+import pytest
+
+from db import DB, connections, setPendingLog
+from eventlog import EventLog, LogCompactor, compactSegment
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    connections.startWriter()
+    yield tmp_path
+    setPendingLog(None)
+    connections.close()
+
+
+def rows(count: int, gender: str = "Male") -> list[dict]:
+    return [{"cam": 0, "age": "(25-32)", "gender": gender} for _ in range(count)]
+
+
+def totals() -> tuple[dict, int]:
+    with connections.reader() as db:
+        return db.countBy("genders", "gender"), len(db.fetchAll())
+
+
+def test_reads_after_close(workdir):
+    log = EventLog("eventlog", segmentRecords=4)
+    setPendingLog(log)
+    log.append(rows(3))
+    log.close()
+    assert totals() == ({"Male": 3, "Female": 0}, 3)
+    compactor = LogCompactor(log)
+    compactor.start()
+    compactor.close()
+    assert totals() == ({"Male": 3, "Female": 0}, 3)
+
+
+def test_crash_replay_counts_every_row_once(workdir):
+    log = EventLog("eventlog", segmentRecords=4)
+    log.append(rows(4) + rows(2, "Female"))
+    log.flush()
+    # The first segment was loaded, then the process died before deleting it
+    compacted = log.sealedSegments()[0]
+    connections.write(lambda db: compactSegment(db, compacted)).result()
+
+    replayed = EventLog("eventlog", segmentRecords=4)
+    setPendingLog(replayed)
+    assert len(replayed.sealedSegments()) == 2
+    assert totals() == ({"Male": 4, "Female": 2}, 6)
+
+    compactor = LogCompactor(replayed)
+    assert compactor.compact() == 2
+    assert replayed.sealedSegments() == []
+    assert totals() == ({"Male": 4, "Female": 2}, 6)
+    db = DB()
+    db.connect()
+    assert db.cursor.execute("SELECT COUNT(*) FROM infos").fetchone()[0] == 6
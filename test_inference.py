@@ -0,0 +1,34 @@
+import numpy as np
+
+import inference
+from models import models
+from sources import SyntheticSource
+
+
+def frames(count: int) -> list:
+    source = SyntheticSource(faces=4, size=(640, 480), realtime=False, seed=1)
+    return [source.read()[1] for _ in range(count)]
+
+
+def test_faceBoxes_handles_several_frames():
+    net = models.get("face")
+    images = frames(3)
+    boxes = inference.faceBoxes(net, images)
+    assert len(boxes) == 3
+    assert boxes == [inference.faceBox(net, image)[1] for image in images]
+
+
+def test_detectFaces_with_several_rois():
+    image = frames(1)[0]
+    boxes = inference.detectFaces(models.get("face"), image, [[0, 0, .5, 1], [.4, 0, 1, 1]])
+    assert all(len(box) == 4 for box in boxes)
+
+
+def test_detectFaces_with_tiling():
+    previous = dict(inference.profile)
+    inference.profile.update(tiling="fixed", tileGrid=[2, 2])
+    try:
+        image = np.zeros((720, 1280, 3), dtype=np.uint8)
+        assert inference.detectFaces(models.get("face"), image) == []
+    finally:
+        inference.profile.update(previous)
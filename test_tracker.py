@@ -0,0 +1,29 @@
+from tracker import BoxTracker
+
+
+def moving(x: float) -> list:
+    return [x, 100, x + 80, 180]
+
+
+def test_velocity_between_detections():
+    tracker = BoxTracker()
+    x = 0.0
+    for frame in range(30):
+        x += 6
+        if frame % 3 == 0:
+            tracks = tracker.update([moving(x)])
+        else:
+            tracks = tracker.predict()
+    assert len(tracks) == 1
+    assert abs(tracks[0].velocity[0] - 6) < 0.1
+    assert abs(tracks[0].box[0] - x) < 1
+
+
+def test_velocity_after_a_missed_detection():
+    tracker = BoxTracker(maxMissed=2)
+    tracker.update([moving(0)])
+    tracker.update([])
+    tracks = tracker.update([moving(12)])
+    assert len(tracks) == 1
+    # 12 px over two updates, halved by the smoothing from zero
+    assert abs(tracks[0].velocity[0] - 3) < 0.01
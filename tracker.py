@@ -0,0 +1,133 @@
+import numpy as np
+
+
+def iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    if inter == 0:
+        return 0.0
+    areaA = (a[2] - a[0]) * (a[3] - a[1])
+    areaB = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(areaA + areaB - inter)
+
+
+class Track:
+    def __init__(self, trackId: int, bbox) -> None:
+        self.id = trackId
+        self.box = np.array(bbox, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        # Velocity is measured between detections, not against predictions
+        self.detected = self.box.copy()
+        self.sinceDetected = 0
+        self.missed = 0
+        self.frames = 0
+        self.ageVotes = None
+        self.genderVotes = None
+        self.classifications = 0
+        self.lastClassified = 0
+
+    @property
+    def bbox(self) -> list[int]:
+        return [int(v) for v in self.box]
+
+    def needsClassification(self, firstFrames: int, refreshFrames: int) -> bool:
+        if self.classifications < firstFrames:
+            return True
+        return refreshFrames > 0 and \
+            self.frames - self.lastClassified >= refreshFrames
+
+    def vote(self, agePred, genderPred) -> None:
+        # Confidence-weighted voting: the softmax outputs are summed so a
+        # confident prediction outweighs several uncertain ones.
+        agePred = np.asarray(agePred, dtype=np.float32).ravel()
+        genderPred = np.asarray(genderPred, dtype=np.float32).ravel()
+        if self.ageVotes is None:
+            self.ageVotes, self.genderVotes = agePred.copy(), genderPred.copy()
+        else:
+            self.ageVotes += agePred
+            self.genderVotes += genderPred
+        self.classifications += 1
+        self.lastClassified = self.frames
+
+    @property
+    def label(self) -> tuple[int, int] | None:
+        if self.ageVotes is None:
+            return None
+        return int(self.ageVotes.argmax()), int(self.genderVotes.argmax())
+
+    def predict(self) -> None:
+        self.box += self.velocity
+        self.sinceDetected += 1
+
+    def miss(self) -> None:
+        self.missed += 1
+        self.sinceDetected += 1
+
+    def correct(self, bbox) -> None:
+        bbox = np.array(bbox, dtype=np.float32)
+        self.velocity = (bbox - self.detected) / (self.sinceDetected + 1) * 0.5 \
+            + self.velocity * 0.5
+        self.box = bbox
+        self.detected = bbox.copy()
+        self.sinceDetected = 0
+        self.missed = 0
+
+
+class BoxTracker:
+    """Cheap IoU tracker which carries face boxes between detections.
+
+    `update` is called with fresh detector output, `predict` on frames where
+    the detector is skipped and moves each box by its estimated velocity.
+    """
+
+    def __init__(self, iouThreshold: float = 0.3, maxMissed: int = 2) -> None:
+        self.iouThreshold = iouThreshold
+        self.maxMissed = maxMissed
+        self.tracks: list[Track] = []
+        self._nextId = 1
+
+    def reset(self) -> None:
+        self.tracks = []
+
+    def current(self) -> list[Track]:
+        return [track for track in self.tracks if track.missed == 0]
+
+    def predict(self) -> list[Track]:
+        for track in self.tracks:
+            track.predict()
+            track.frames += 1
+        return [track for track in self.tracks if track.missed == 0]
+
+    def update(self, bboxes) -> list[Track]:
+        pairs = sorted(
+            ((iou(track.box, bbox), t, d)
+             for t, track in enumerate(self.tracks)
+             for d, bbox in enumerate(bboxes)),
+            reverse=True
+        )
+        matchedTracks, matchedBoxes = set(), set()
+        for score, t, d in pairs:
+            if score < self.iouThreshold:
+                break
+            if t in matchedTracks or d in matchedBoxes:
+                continue
+            self.tracks[t].correct(bboxes[d])
+            matchedTracks.add(t)
+            matchedBoxes.add(d)
+
+        tracks = []
+        for t, track in enumerate(self.tracks):
+            track.frames += 1
+            if t not in matchedTracks:
+                track.miss()
+                if track.missed > self.maxMissed:
+                    continue
+            tracks.append(track)
+        for d, bbox in enumerate(bboxes):
+            if d not in matchedBoxes:
+                tracks.append(Track(self._nextId, bbox))
+                self._nextId += 1
+        self.tracks = tracks
+        # Unmatched tracks are kept alive a little while but not reported
+        return [track for track in self.tracks if track.missed == 0]
@@ -2,59 +2,95 @@ from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from logger import logger
+from cameras import capturePool
+from pipeline import LatestSlot, BoundedSlot, DropOldestQueue, LatencyMeter, ReadBackoff, Stage, PreviewRing, frameSlot
+from tracker import BoxTracker
+from motion import MotionGate
+from config import getCameraConfig, setCameraConfig, getGovernorConfig
+from governor import ThroughputGovernor
+from inference import detectFaces, predictFaces, ageList, genderList
+from models import models
 
 import cv2
+import time
 
 box_color = (55, 255, 75)
 male_color = (220, 160, 108)
 female_color = (236, 191, 255)
 
 
-def faceBox(faceNet, frame):
-    frameHeight = frame.shape[0]
-    frameWidth = frame.shape[1]
-    blob = cv2.dnn.blobFromImage(frame, 1.0, (300, 300), [
-                                 104, 117, 123], swapRB=False)
-    faceNet.setInput(blob)
-    detection = faceNet.forward()
-    bboxs = []
-    for i in range(detection.shape[2]):
-        confidence = detection[0, 0, i, 2]
-        if confidence > 0.7:
-            x1 = int(detection[0, 0, i, 3]*frameWidth)
-            y1 = int(detection[0, 0, i, 4]*frameHeight)
-            x2 = int(detection[0, 0, i, 5]*frameWidth)
-            y2 = int(detection[0, 0, i, 6]*frameHeight)
-            bboxs.append([x1, y1, x2, y2])
+class CameraChannel:
+    """Per camera tracking and classification state."""
 
-    return frame, bboxs
+    def __init__(self, cameraIndex: int) -> None:
+        self.cameraIndex = cameraIndex
+        self.config = getCameraConfig(cameraIndex)
+        self.baseConfig = dict(self.config)
+        self.tracker = BoxTracker()
+        self.gate = MotionGate(self.config["motionThreshold"],
+                               self.config["motionKeepAlive"])
+        self.frameNo = 0
+        self.lastDetection = 0.0
 
+    def reset(self) -> None:
+        self.config = getCameraConfig(self.cameraIndex)
+        self.baseConfig = dict(self.config)
+        self.tracker.reset()
+        self.gate = MotionGate(self.config["motionThreshold"],
+                               self.config["motionKeepAlive"])
+        self.frameNo = 0
+        self.lastDetection = 0.0
 
-faceProto = "weights/opencv_face_detector.pbtxt"
-faceModel = "weights/opencv_face_detector_uint8.pb"
+    def hasMotion(self, frame) -> bool:
+        # Static frames keep the last known faces without running any net
+        return not self.config["motionGate"] or self.gate.check(frame)
 
-ageProto = "weights/age_deploy.prototxt"
-ageModel = "weights/age_net.caffemodel"
+    def detectionDue(self) -> bool:
+        # Full detection only runs every `detectInterval` frames (or when the
+        # `detectSeconds` timer expires), the tracker fills the gaps.
+        now = time.perf_counter()
+        interval = max(1, int(self.config["detectInterval"]))
+        seconds = self.config["detectSeconds"]
+        due = self.frameNo % interval == 0 or \
+            (seconds > 0 and now - self.lastDetection >= seconds)
+        self.frameNo += 1
+        if due:
+            self.lastDetection = now
+        return due
 
-genderProto = "weights/gender_deploy.prototxt"
-genderModel = "weights/gender_net.caffemodel"
+    def pendingTracks(self, tracks) -> list:
+        # Each track is classified on its first frames and then only at a slow
+        # refresh rate, the votes are merged into a cached label.
+        return [
+            track for track in tracks
+            if track.needsClassification(self.config["classifyFrames"],
+                                         self.config["classifyRefresh"])
+        ]
 
-faceNet = cv2.dnn.readNet(faceModel, faceProto)
-ageNet = cv2.dnn.readNet(ageModel, ageProto)
-genderNet = cv2.dnn.readNet(genderModel, genderProto)
-
-MODEL_MEAN_VALUES = (78.4263377603, 87.7689143744, 114.895847746)
-ageList = ['(0-2)', '(4-6)', '(8-12)', '(13-17)', '(18-24)',
-           '(25-32)', '(38-43)', '(48-53)', '(60-100)']
-genderList = ['Male', 'Female']
-
-padding = 20
+    def results(self, tracks) -> tuple[list, list, list]:
+        data = []
+        bboxes, labels = [], []
+        for track in tracks:
+            bboxes.append(track.bbox)
+            if track.label is None:
+                labels.append(None)
+                continue
+            age, gender = ageList[track.label[0]], genderList[track.label[1]]
+            labels.append((age, gender))
+            data.append({
+                "cam": self.cameraIndex,
+                "age": age,
+                "gender": gender,
+                "track": track.id
+            })
+        return bboxes, labels, data
 
 
 class FaceDetector(QThread):
     status = pyqtSignal(str)
-    changePixmap = pyqtSignal(QImage)
+    previewReady = pyqtSignal()
     result = pyqtSignal(list)
+    stats = pyqtSignal(dict)
 
     canDetect: bool = True
     canDraw: bool = False
@@ -64,79 +100,244 @@ class FaceDetector(QThread):
     drawAge: bool = False
     drawGender: bool = False
 
+    renderQueueSize: int = 2
+    previewFps: float = 30.0
+    previewSize: tuple[int, int] = (640, 480)
+    statsInterval: float = 1.0
+
+    _runId: int = 0
+    _stopping: bool = False
+    _switchStarted: float | None = None
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.channel = CameraChannel(self.cameraIndex)
+        self.preview = PreviewRing()
+        governorConfig = getGovernorConfig()
+        self.governor = ThroughputGovernor(governorConfig["targetFps"],
+                                           governorConfig["targetCpu"])
+        self._lastPreview = 0.0
+
+    def drawOverlays(self, frame, bboxes, labels) -> None:
+        for bbox, prediction in zip(bboxes, labels):
+            if prediction is None:
+                continue
+            age, gender = prediction
+            dcolor = box_color
+            if self.drawFace:
+                x1, y1, x2, y2 = bbox
+                cv2.rectangle(frame, (x1, y1),
+                              (x2, y2), dcolor, 2)
+
+            label = ""
+            gen_color = male_color if gender == "Male" else female_color
+            if self.drawAge:
+                dcolor = box_color
+                label += str(age)
+            if self.drawGender and self.drawAge:
+                label += " | "
+            if self.drawGender:
+                dcolor = gen_color
+                label += gender
+
+            if self.drawAge or self.drawGender:
+                cv2.rectangle(
+                    frame, (bbox[0], bbox[1]-30), (bbox[2], bbox[1]), dcolor, -1)
+
+                cv2.putText(
+                    frame, label, (bbox[0], bbox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
+
+    def locateFaces(self, frame) -> list:
+        if self.channel.detectionDue():
+            bboxes = detectFaces(models.get("face"), frame,
+                                 self.channel.config["rois"])
+            return self.channel.tracker.update(bboxes)
+        return self.channel.tracker.predict()
+
+    def classifyTracks(self, frame, tracks) -> None:
+        pending = self.channel.pendingTracks(tracks)
+        if not pending:
+            return
+        preds = predictFaces(frame, [track.bbox for track in pending])
+        for track, pred in zip(pending, preds):
+            if pred is not None:
+                track.vote(*pred)
+
+    def infer(self, frame) -> tuple[list, list, list]:
+        if not self.channel.hasMotion(frame):
+            return self.channel.results(self.channel.tracker.current())
+        tracks = self.locateFaces(frame)
+        self.classifyTracks(frame, tracks)
+        return self.channel.results(tracks)
+
+    def previewDue(self) -> bool:
+        return time.perf_counter() - self._lastPreview >= 1 / self.previewFps
+
+    def emitFrame(self, frame) -> None:
+        # Previews are scaled in the worker to the size of the (scaled
+        # contents) camera label and written into reused buffers, only a single
+        # preview is ever pending.
+        self._lastPreview = time.perf_counter()
+        if self.preview.write(frame, self.previewSize):
+            self.previewReady.emit()
+
+    def takePreview(self) -> QImage | None:
+        frame = self.preview.take()
+        if frame is None:
+            return None
+        h, w, ch = frame.shape
+        bytes_per_line = ch * w
+        return QImage(
+            frame.data,
+            w,
+            h,
+            bytes_per_line,
+            QImage.Format.Format_BGR888
+        )
+
+    def pipelineStats(self) -> dict:
+        stages = getattr(self, "_stages", None)
+        if stages is None:
+            return {}
+        captured, rendered, latency = stages
+        return {
+            "captured": captured.total,
+            "captureDropped": captured.dropped,
+            "rendered": rendered.total,
+            "renderDropped": rendered.dropped,
+            "latencyMs": round(latency.value, 1),
+            "maxLatencyMs": round(latency.max, 1),
+            "previews": self.preview.published,
+            "previewsCoalesced": self.preview.coalesced,
+            **self.channel.gate.stats(),
+            "governor": self.governor.operatingPoint(),
+        }
+
     @pyqtSlot()
     def run(self) -> None:
-        self.status.emit(f"CAM {str(self.cameraIndex)} Starting")
+        # The loop is split in three stages so a slow inference never stalls
+        # the camera: capture keeps only the newest frame, inference picks it
+        # up whenever it is free and render draws/emits the results.
+        self._runId += 1
+        runId = self._runId
+        self._stopping = False
+        cameraIndex = self.cameraIndex
+        self.status.emit(f"CAM {str(cameraIndex)} Starting")
+        self.channel.reset()
+        self.governor.apply([self.channel])
         try:
-            cap = cv2.VideoCapture(self.cameraIndex)
+            cap, warm = capturePool.acquire(cameraIndex)
+            captured = frameSlot(cap)
+            backoff = ReadBackoff()
+            # Without live input nothing has to be dropped, every frame is
+            # rendered in order
+            rendered = DropOldestQueue(self.renderQueueSize) \
+                if isinstance(captured, LatestSlot) else BoundedSlot(self.renderQueueSize)
+            latency = LatencyMeter()
+            self._stages = (captured, rendered, latency)
+
+            def alive() -> bool:
+                return self.canDetect and not self._stopping and runId == self._runId
+
+            def captureStep():
+                if not alive() or not cap.isOpened():
+                    return False
+                ok, frame = cap.read()
+                if ok:
+                    backoff.ok()
+                    captured.put((time.perf_counter(), frame))
+                elif not backoff.failed():
+                    logger.error(f"CAM {cameraIndex} delivers no frames, giving up")
+                    return False
+
+            def inferenceStep():
+                if not alive():
+                    return False
+                item = captured.get(0.1)
+                if item is None:
+                    if captureStage.stopped() and captured.empty():
+                        # The source has ended and its last frame is done
+                        return False
+                    return
+                capturedAt, frame = item
+                started = time.perf_counter()
+                rendered.put((capturedAt, frame, *self.infer(frame)))
+                elapsed = time.perf_counter() - started
+                self.governor.update(elapsed, [self.channel])
+                self.governor.pace(elapsed)
+
+            captureStage = Stage("capture", captureStep)
+            # The nets stay loaded for the next run, e.g. after a switch
+            inferenceStage = Stage("inference", inferenceStep, models.preload, models.release)
+            captureStage.start()
+            inferenceStage.start()
+
             self.status.emit("Capturing")
-            while cap.isOpened() and self.canDetect:
-                _, frame = cap.read()
-
-                data = []
-                frame, bboxes = faceBox(faceNet, frame)
-                for bbox in bboxes:
-                    face = frame[
-                        max(0, bbox[1]-padding):min(bbox[3]+padding, frame.shape[0]-1),
-                        max(0, bbox[0]-padding):min(bbox[2]+padding, frame.shape[1]-1)
-                    ]
-                    blob = cv2.dnn.blobFromImage(
-                        face, 1.0, (227, 227), MODEL_MEAN_VALUES, swapRB=False)
-                    genderNet.setInput(blob)
-                    genderPred = genderNet.forward()
-                    gender = genderList[genderPred[0].argmax()]
-
-                    ageNet.setInput(blob)
-                    agePred = ageNet.forward()
-                    age = ageList[agePred[0].argmax()]
-
-                    data.append({
-                        "cam": self.cameraIndex,
-                        "age": age,
-                        "gender": gender
-                    })
-
-                    if self.canDraw:
-                        dcolor = box_color
-                        if self.drawFace:
-                            x1, y1, x2, y2 = bbox
-                            cv2.rectangle(frame, (x1, y1),
-                                          (x2, y2), dcolor, 2)
-
-                        label = ""
-                        gen_color = male_color if gender == "Male" else female_color
-                        if self.drawAge:
-                            dcolor = box_color
-                            label += str(age)
-                        if self.drawGender and self.drawAge:
-                            label += " | "
-                        if self.drawGender:
-                            dcolor = gen_color
-                            label += gender
-
-                        if self.drawAge or self.drawGender:
-                            cv2.rectangle(
-                                frame, (bbox[0], bbox[1]-30), (bbox[2], bbox[1]), dcolor, -1)
-
-                            cv2.putText(
-                                frame, label, (bbox[0], bbox[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2, cv2.LINE_AA)
-
-                self.result.emit(data)
-                h, w, ch = frame.shape
-                bytes_per_line = ch * w
-                image = QImage(
-                    frame,
-                    w,
-                    h,
-                    bytes_per_line,
-                    QImage.Format.Format_BGR888
-                )
-                self.changePixmap.emit(image)
-            cap.release()
+            lastStats = time.perf_counter()
+            try:
+                while alive():
+                    item = rendered.get(0.1)
+                    if item is None:
+                        if inferenceStage.stopped():
+                            break
+                        continue
+                    capturedAt, frame, bboxes, labels, data = item
+                    if self._switchStarted is not None:
+                        logger.info(
+                            f"Switched to CAM {cameraIndex} in "
+                            f"{(time.perf_counter() - self._switchStarted) * 1000:.0f} ms "
+                            f"({'warm' if warm else 'cold'} capture)")
+                        self._switchStarted = None
+                    self.result.emit(data)
+                    if self.previewDue():
+                        if self.canDraw:
+                            self.drawOverlays(frame, bboxes, labels)
+                        self.emitFrame(frame)
+                    latency.add(capturedAt)
+
+                    if time.perf_counter() - lastStats >= self.statsInterval:
+                        lastStats = time.perf_counter()
+                        self.stats.emit(self.pipelineStats())
+            finally:
+                captureStage.stop()
+                inferenceStage.stop()
+                for slot in (captured, rendered):
+                    if isinstance(slot, BoundedSlot):
+                        slot.close()
+                captureStage.join(2)
+                inferenceStage.join(2)
+                if captureStage.is_alive():
+                    # Still blocked in read(), the capture can't be shared
+                    logger.warning(f"CAM {cameraIndex} capture did not stop in time")
+                    cap.release()
+                else:
+                    capturePool.release(cameraIndex, cap)
+            for stage in (captureStage, inferenceStage):
+                if stage.error is not None:
+                    raise stage.error
         except Exception as e:
             self.status.emit(str(e))
             print(str(e))
 
+    def stop(self, timeout: int = 3000) -> None:
+        # Cooperative shutdown, the loop notices the flag within one queue
+        # timeout and hands its capture back to the pool
+        if not self.isRunning():
+            return
+        self._stopping = True
+        if not self.wait(timeout):
+            logger.warning("Detector did not stop in time, terminating it")
+            self.terminate()
+            self.wait()
+
+    def switchCamera(self, a0: int):
+        # Set once the old run has ended, so only the new one reports it
+        started = time.perf_counter()
+        self.stop()
+        self._switchStarted = started
+        self.setCameraIndex(a0)
+        self.start()
+
     def toggleDraw(self):
         self.canDraw = not self.canDraw
         logger.info(f"Draw is toggled to {self.canDraw}")
@@ -161,8 +362,29 @@ class FaceDetector(QThread):
 
     def setCameraIndex(self, a0: int):
         self.cameraIndex = a0
+        self.channel = CameraChannel(a0)
         logger.info(f"Camera changed to index {a0}")
 
+    def setDetectInterval(self, frames: int, seconds: float = 0.0):
+        self.channel.config["detectInterval"] = max(1, frames)
+        self.channel.config["detectSeconds"] = max(0.0, seconds)
+        setCameraConfig(self.cameraIndex, detectInterval=max(1, frames),
+                        detectSeconds=max(0.0, seconds))
+        logger.info(
+            f"CAM {self.cameraIndex} detection interval is set to {frames} frames / {seconds} s")
+
+    def setPreviewSize(self, width: int, height: int):
+        self.previewSize = (max(1, width), max(1, height))
+
+    def setPreviewFps(self, fps: float):
+        self.previewFps = max(1.0, fps)
+        logger.info(f"Preview FPS is capped to {self.previewFps}")
+
+    def setTarget(self, fps: float = 0, cpu: float = 0):
+        self.governor.targetFps = max(0.0, fps)
+        self.governor.targetCpu = max(0.0, cpu)
+        logger.info(f"Governor target is set to {fps} fps / {cpu}% CPU")
+
     def setDrawOption(self, opt: str, a0: bool):
         if hasattr(self, opt):
             setattr(self, opt, a0)